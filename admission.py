@@ -0,0 +1,163 @@
+import asyncio
+import math
+import time
+from typing import Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from config import ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_DEADLINE_MS
+
+# weight of the newest request in the moving average service time
+SERVICE_TIME_SMOOTHING = 0.1
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionController:
+    """
+    Bounds how many detection requests run at once and how many may wait for a slot.
+
+    A request finding every slot busy joins the queue only if the queue has room (429 otherwise) and
+    its expected wait, from the queue length and the moving average service time, fits its deadline
+    (503 otherwise). A queued request still not running at its deadline gets 503 as well.
+    Rejections carry a Retry-After estimate of when a slot frees up.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, deadline_ms: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.deadline = deadline_ms / 1000
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        # stats
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_deadline = 0
+        self.timed_out = 0
+        self.service_time = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrent > 0
+
+    def expected_wait(self, position: int) -> float:
+        """Seconds until the request at this queue position (1 = next) gets a slot."""
+        return position * self.service_time / self.max_concurrent
+
+    async def _acquire(self, deadline: float):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+
+        # a free slot and nobody queued ahead
+        if not self._slots.locked():
+            await self._slots.acquire()
+            return
+
+        if self.waiting >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise Rejected(429, "Too many detection requests queued", self.expected_wait(self.waiting + 1))
+
+        expected = self.expected_wait(self.waiting + 1)
+        if expected > deadline:
+            self.rejected_deadline += 1
+            raise Rejected(503, "Detection request would not start before its deadline", expected)
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), deadline)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise Rejected(503, "Detection request did not start before its deadline", self.expected_wait(self.waiting))
+        finally:
+            self.waiting -= 1
+
+    async def acquire(self, deadline: Optional[float] = None):
+        """
+        Waits for a slot, raises Rejected if the request can't get one. Every acquire needs a release.
+
+        :param deadline: Seconds the request may wait for a slot, the configured deadline if not given.
+        """
+        if not self.enabled:
+            return
+
+        await self._acquire(self.deadline if deadline is None else min(deadline, self.deadline))
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self, elapsed: float):
+        """
+        :param elapsed: Seconds the request held its slot, feeds the service time estimate.
+        """
+        if not self.enabled:
+            return
+
+        self.service_time += SERVICE_TIME_SMOOTHING * (elapsed - self.service_time) if self.service_time else elapsed
+        self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "deadline_ms": self.deadline * 1000,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_deadline": self.rejected_deadline,
+            "timed_out": self.timed_out,
+            "service_ms": round(self.service_time * 1000, 3),
+        }
+
+
+class AdmissionMiddleware:
+    """
+    Applies an AdmissionController to POST requests under the given path prefixes.
+
+    Runs before the route reads the request body, so a rejected or queued request holds no image in memory.
+    Clients may ask for a shorter deadline with an "X-Deadline-Ms" header.
+    """
+
+    def __init__(self, app, controller: AdmissionController, prefixes: Tuple[str, ...] = ("/find-flower",)):
+        self.app = app
+        self.controller = controller
+        self.prefixes = prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        deadline = None
+        for name, value in scope["headers"]:
+            if name == b"x-deadline-ms":
+                try:
+                    deadline = float(value) / 1000
+                except ValueError:
+                    pass
+
+        try:
+            await self.controller.acquire(deadline)
+        except Rejected as e:
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code,
+                                    headers={"Retry-After": str(e.retry_after)})
+            await response(scope, receive, send)
+            return
+
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(time.monotonic() - start)
+
+
+# Global admission controller for the detection routes
+admission_controller = AdmissionController(ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_DEADLINE_MS)
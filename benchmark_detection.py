@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import base64
+import glob
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Tuple, Union
+
+import cv2
+import numpy
+import psutil
+from fastapi.concurrency import run_in_threadpool
+
+from pipeline_timing import record_stages
+
+# frame sizes used when no image folder is given, up to the 6.4k x 4.8k rover frames
+SYNTHETIC_RESOLUTIONS = [(640, 480), (1920, 1080), (4000, 3000), (6400, 4800)]
+
+STAGES = ["base64_decode", "imdecode", "rotate", "gate", "inference", "draw", "png_encode", "base64_encode"]
+
+
+def synthetic_frame(width: int, height: int, seed: int = 0) -> bytes:
+    """A JPEG with white blobs on a green background, roughly like a strawberry field."""
+    rng = numpy.random.default_rng(seed)
+    image = numpy.full((height, width, 3), (40, 120, 50), numpy.uint8)
+    image += rng.integers(0, 30, image.shape, dtype=numpy.uint8)
+
+    radius = max(4, min(width, height) // 80)
+    for x, y in rng.integers(0, (width, height), size=(60, 2)):
+        cv2.circle(image, (int(x), int(y)), radius, (235, 240, 245), -1)
+
+    _, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buffer.tobytes()
+
+
+def load_frames(image_dir: str) -> List[Tuple[str, bytes]]:
+    if not image_dir:
+        return [(f"{w}x{h}", synthetic_frame(w, h)) for w, h in SYNTHETIC_RESOLUTIONS]
+
+    frames = []
+    for path in sorted(glob.glob(os.path.join(image_dir, "*"))):
+        if path.lower().endswith((".jpg", ".jpeg", ".png")):
+            with open(path, "rb") as f:
+                frames.append((os.path.basename(path), f.read()))
+    if not frames:
+        raise FileNotFoundError(f"No images found in {image_dir}")
+    return frames
+
+
+def percentile(values: List[float], q: float) -> float:
+    return round(float(numpy.percentile(values, q)) * 1000, 3) if values else 0.0
+
+
+class RssSampler:
+    """Peak resident memory of this process plus its children (the detection pool workers) while the block runs."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def _rss(self) -> int:
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return total
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, self._rss())
+
+    def __enter__(self):
+        self.peak = self._rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+    @property
+    def peak_mb(self) -> float:
+        return round(self.peak / (1024 * 1024), 1)
+
+
+# a detection path, taking the frame as bytes (binary routes) or as base64 text (JSON routes)
+Detector = Callable[[Union[bytes, str]], Awaitable[dict]]
+
+
+async def run_case(detector: Detector, data: Union[bytes, str], concurrency: int, requests: int) -> dict:
+    """Runs one detector over one frame at one concurrency level, concurrency requests in flight at a time."""
+
+    async def call():
+        with record_stages() as timings:
+            start = time.perf_counter()
+            await detector(data)
+            return time.perf_counter() - start, timings
+
+    async def calls(count: int):
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with slots:
+                return await call()
+
+        return await asyncio.gather(*(one() for _ in range(count)))
+
+    # warm-up (model copy per thread, lazy allocations)
+    await calls(concurrency)
+
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        results = await calls(requests)
+        elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _ in results]
+    stages = {}
+    for name in STAGES:
+        values = [timings[name] for _, timings in results if name in timings]
+        if values:
+            stages[name] = {"p50_ms": percentile(values, 50), "p95_ms": percentile(values, 95),
+                            "mean_ms": round(float(numpy.mean(values)) * 1000, 3)}
+
+    return {
+        "requests": requests,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "throughput_rps": round(requests / elapsed, 2),
+        "peak_rss_mb": rss.peak_mb,
+        "stages": stages,
+    }
+
+
+async def build_detectors(names: List[str], yolo_model: str) -> Dict[str, Tuple[Detector, bool]]:
+    """
+    The detection paths of the routes (run_cv, run_yolo: detection pool, YOLO batch scheduler, frame gate),
+    set up as main.py does. The result cache is off, every request of a case is the same frame.
+    The "-base64" detectors take the frame as base64 text and decode it as the JSON routes do.
+
+    :return: Detector and whether it takes base64 text, by name.
+    """
+    from config import YOLO_ENGINE, YOLO_PRECISION
+    from detection_pool import pool, start_pool
+    from model_registry import load_models
+    from result_cache import result_cache
+    from routes.flower import decode_base64_image, run_cv, run_yolo
+    from yolo_method import warm_up, yolo_scheduler
+
+    result_cache.max_entries, result_cache.disk_dir = 0, None
+
+    if any(name.startswith("yolo") for name in names):
+        await run_in_threadpool(load_models, yolo_model, "", YOLO_ENGINE, YOLO_PRECISION, not pool.enabled)
+        if not pool.enabled:
+            await run_in_threadpool(warm_up)
+    if pool.enabled:
+        start_pool()
+        await run_in_threadpool(pool.wait_ready)
+    yolo_scheduler.start()
+
+    def from_base64(detect: Detector) -> Detector:
+        async def detector(image: str) -> dict:
+            return await detect(await decode_base64_image(image))
+        return detector
+
+    paths = {
+        "cv": lambda data: run_cv(data, True),
+        "yolo": lambda data: run_yolo(data, None, None, True),
+        "yolo-coords": lambda data: run_yolo(data, None, None, False),
+    }
+    detectors = {}
+    for name in names:
+        takes_base64 = name.endswith("-base64")
+        path = name[:-len("-base64")] if takes_base64 else name
+        if path in paths:
+            detectors[name] = (from_base64(paths[path]) if takes_base64 else paths[path], takes_base64)
+    return detectors
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> List[str]:
+    """Lists cases whose p95 latency or throughput got worse than the baseline by more than threshold."""
+    with open(baseline_path) as f:
+        baseline = {(case["detector"], case["image"], case["concurrency"]): case for case in json.load(f)["cases"]}
+
+    regressions = []
+    for case in results["cases"]:
+        old = baseline.get((case["detector"], case["image"], case["concurrency"]))
+        if old is None:
+            continue
+        if case["p95_ms"] > old["p95_ms"] * (1 + threshold):
+            regressions.append(f"{case['detector']} {case['image']} c={case['concurrency']}: "
+                               f"p95 {old['p95_ms']} -> {case['p95_ms']} ms")
+        if case["throughput_rps"] < old["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{case['detector']} {case['image']} c={case['concurrency']}: "
+                               f"throughput {old['throughput_rps']} -> {case['throughput_rps']} req/s")
+    return regressions
+
+
+async def main(args) -> dict:
+    from detection_pool import pool
+    from yolo_method import yolo_scheduler
+
+    detectors = await build_detectors(args.detectors.split(","), args.model)
+    frames = load_frames(args.images)
+
+    results = {
+        "started_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "cases": [],
+    }
+    try:
+        for detector_name, (detector, takes_base64) in detectors.items():
+            for image_name, data in frames:
+                payload = base64.b64encode(data).decode() if takes_base64 else data
+                for concurrency in map(int, args.concurrency.split(",")):
+                    case = await run_case(detector, payload, concurrency, args.requests)
+                    case.update(detector=detector_name, image=image_name, image_bytes=len(data), concurrency=concurrency)
+                    results["cases"].append(case)
+                    print(f"{detector_name:12} {image_name:14} c={concurrency:<3} p50={case['p50_ms']:>9}ms "
+                          f"p95={case['p95_ms']:>9}ms p99={case['p99_ms']:>9}ms {case['throughput_rps']:>8} req/s "
+                          f"rss={case['peak_rss_mb']}MB")
+    finally:
+        await yolo_scheduler.stop()
+        pool.stop()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency/throughput benchmark of the flower detectors.")
+    parser.add_argument("--images", default="", help="Folder of test frames (synthetic frames if not given).")
+    parser.add_argument("--detectors", default="cv,cv-base64,yolo,yolo-base64,yolo-coords")
+    parser.add_argument("--concurrency", default="1,4")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per case.")
+    parser.add_argument("--model", default="YOLOv8-str-flower-model.pt")
+    parser.add_argument("--output", default="", help="Write results as JSON to this file.")
+    parser.add_argument("--baseline", default="", help="Earlier results JSON to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed relative regression.")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+import os
+import time
+
+from blob_storage import create_storage, MemoryBlobStorage
+from upload_image import AsyncBlobUploader
+
+
+async def run(uploader: AsyncBlobUploader, count: int, size: int) -> dict:
+    images = [(os.urandom(size), "jpeg") for _ in range(count)]
+
+    started = time.perf_counter()
+    urls = await uploader.upload_many(images)
+    elapsed = time.perf_counter() - started
+    await uploader.close()
+
+    return {
+        "uploads": len(urls),
+        "seconds": round(elapsed, 3),
+        "uploads_per_second": round(len(urls) / elapsed, 2),
+        "mb_per_second": round(count * size / elapsed / 1e6, 2),
+        **uploader.stats(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of the async blob uploads against a storage backend, e.g. "
+                                                 "Azurite (AZURE_STORAGE_CONNECTION_STRING=UseDevelopmentStorage=true).")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=256)
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--retries", type=int, default=4)
+    parser.add_argument("--backend", default="memory", help="azure, local or memory.")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Simulated round trip of the memory backend.")
+    args = parser.parse_args()
+
+    for concurrency in map(int, args.concurrency.split(",")):
+        if args.backend == "memory":
+            blob_storage = MemoryBlobStorage(latency_ms=args.latency_ms)
+        else:
+            blob_storage = create_storage(args.backend)
+        uploader = AsyncBlobUploader(blob_storage, concurrency, args.retries, 200)
+        result = asyncio.run(run(uploader, args.count, args.size_kb * 1024))
+        print(f"c={concurrency:<3} {result['uploads_per_second']:>9} uploads/s {result['mb_per_second']:>8} MB/s "
+              f"retried={result['retried']} failed={result['failed']}")
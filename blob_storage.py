@@ -0,0 +1,203 @@
+import asyncio
+import os
+import uuid
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, Union
+
+from config import (STORAGE_BACKEND, STORAGE_LOCAL_DIR, STORAGE_PUBLIC_URL, STORAGE_MEMORY_LATENCY_MS, STORAGE_CHUNK_SIZE,
+                    AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME)
+
+# blob content: bytes, or chunks of it
+Chunks = Union[bytes, bytearray, memoryview, Iterable[bytes], AsyncIterable[bytes]]
+
+
+async def iter_chunks(data: Chunks, chunk_size: int = STORAGE_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data)
+        for offset in range(0, len(view), chunk_size):
+            yield view[offset:offset + chunk_size]
+    elif hasattr(data, "__aiter__"):
+        async for chunk in data:
+            yield chunk
+    else:
+        for chunk in data:
+            yield chunk
+
+
+def check_name(name: str) -> str:
+    # blob names are flat, never a path out of the store
+    if not name or name != os.path.basename(name) or name.startswith("."):
+        raise FileNotFoundError(f"Invalid blob name: {name}")
+    return name
+
+
+class BlobStorage:
+    """
+    Where ingested images are kept. Writes take bytes or a stream of chunks, reads return a stream of chunks.
+    Missing blobs raise FileNotFoundError on every backend.
+    """
+
+    async def write(self, name: str, data: Chunks) -> str:
+        """
+        :param name: Blob name, e.g. "<uuid>.jpeg".
+        :return: URL of the stored blob.
+        """
+        raise NotImplementedError
+
+    async def read(self, name: str) -> AsyncIterator[bytes]:
+        """Opens a blob, raises FileNotFoundError if it doesn't exist, and returns its chunks."""
+        raise NotImplementedError
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Whether a failed write is worth retrying (throttling, network), not e.g. a full disk."""
+        return isinstance(error, (ConnectionError, asyncio.TimeoutError))
+
+    async def close(self):
+        pass
+
+
+class MemoryBlobStorage(BlobStorage):
+    """Blobs kept in process, after a simulated round trip. For tests and offline load tests."""
+
+    def __init__(self, public_url: str = STORAGE_PUBLIC_URL, latency_ms: float = 0):
+        self.public_url = public_url.rstrip("/")
+        self.latency = latency_ms / 1000
+        self.blobs: Dict[str, bytearray] = {}
+
+    async def write(self, name: str, data: Chunks) -> str:
+        blob = bytearray()
+        async for chunk in iter_chunks(data):
+            blob += chunk
+        await asyncio.sleep(self.latency)
+        self.blobs[check_name(name)] = blob
+        return f"{self.public_url}/{name}"
+
+    async def read(self, name: str) -> AsyncIterator[bytes]:
+        blob = self.blobs.get(check_name(name))
+        if blob is None:
+            raise FileNotFoundError(f"Blob not found: {name}")
+        return iter_chunks(bytes(blob))
+
+
+class LocalBlobStorage(BlobStorage):
+    """
+    Blobs as files in one directory, for edge deployments and single box load tests.
+    A blob is written to a temporary file chunk by chunk and renamed into place once complete.
+    """
+
+    def __init__(self, root: str = STORAGE_LOCAL_DIR, public_url: str = STORAGE_PUBLIC_URL,
+                 chunk_size: int = STORAGE_CHUNK_SIZE):
+        self.root = root
+        self.public_url = public_url.rstrip("/")
+        self.chunk_size = chunk_size
+        os.makedirs(root, exist_ok=True)
+
+    async def write(self, name: str, data: Chunks) -> str:
+        path = os.path.join(self.root, check_name(name))
+        temp_path = os.path.join(self.root, f".{uuid.uuid4().hex}.tmp")
+
+        file = await asyncio.to_thread(open, temp_path, "wb")
+        try:
+            async for chunk in iter_chunks(data, self.chunk_size):
+                await asyncio.to_thread(file.write, chunk)
+            await asyncio.to_thread(file.close)
+            os.replace(temp_path, path)
+        except BaseException:
+            file.close()
+            os.remove(temp_path)
+            raise
+        return f"{self.public_url}/{name}"
+
+    async def read(self, name: str) -> AsyncIterator[bytes]:
+        file = await asyncio.to_thread(open, os.path.join(self.root, check_name(name)), "rb")
+
+        async def chunks():
+            try:
+                while chunk := await asyncio.to_thread(file.read, self.chunk_size):
+                    yield chunk
+            finally:
+                file.close()
+
+        return chunks()
+
+    def is_retryable(self, error: Exception) -> bool:
+        return False
+
+
+class AzureBlobStorage(BlobStorage):
+    """
+    Azure Blob Storage (or Azurite) through one shared async ContainerClient, created on first use on the
+    running event loop. The SDK's own retries are off, AsyncBlobUploader retries with jittered backoff.
+    """
+
+    def __init__(self, connection_string: str = AZURE_STORAGE_CONNECTION_STRING,
+                 container_name: str = AZURE_STORAGE_CONTAINER_NAME):
+        self.connection_string = connection_string or ""
+        self.container_name = container_name
+        self._client = None
+        self._client_lock = None
+
+    async def _container(self):
+        if self._client_lock is None:
+            self._client_lock = asyncio.Lock()
+
+        async with self._client_lock:
+            if self._client is None:
+                from azure.core.exceptions import ResourceExistsError
+                from azure.storage.blob.aio import BlobServiceClient
+
+                service = BlobServiceClient.from_connection_string(self.connection_string, retry_total=0)
+                self._client = service.get_container_client(self.container_name)
+
+                # Azurite starts empty, create the container there
+                if any(local in self.connection_string for local in ("UseDevelopmentStorage", "127.0.0.1")):
+                    try:
+                        await self._client.create_container()
+                    except ResourceExistsError:
+                        pass
+            return self._client
+
+    async def write(self, name: str, data: Chunks) -> str:
+        blob_client = (await self._container()).get_blob_client(check_name(name))
+
+        # bytes go up in one request, streams as staged blocks
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = iter_chunks(data)
+        await blob_client.upload_blob(data, overwrite=True)
+        return blob_client.url
+
+    async def read(self, name: str) -> AsyncIterator[bytes]:
+        from azure.core.exceptions import ResourceNotFoundError
+
+        blob_client = (await self._container()).get_blob_client(check_name(name))
+        try:
+            downloader = await blob_client.download_blob()
+        except ResourceNotFoundError:
+            raise FileNotFoundError(f"Blob not found: {name}")
+        return downloader.chunks()
+
+    def is_retryable(self, error: Exception) -> bool:
+        from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+
+        if isinstance(error, (ServiceRequestError, ServiceResponseError)) or super().is_retryable(error):
+            return True
+        # throttling and server side errors, not bad requests or auth failures
+        return isinstance(error, HttpResponseError) and (error.status_code == 429 or (error.status_code or 0) >= 500)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> BlobStorage:
+    if backend == "azure":
+        return AzureBlobStorage()
+    if backend == "local":
+        return LocalBlobStorage()
+    if backend == "memory":
+        return MemoryBlobStorage(latency_ms=STORAGE_MEMORY_LATENCY_MS)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+# Global blob storage instance
+storage = create_storage()
@@ -6,3 +6,121 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME")
 RUST_ROVER_REGISTRATION_URL = os.getenv("RUST_ROVER_REGISTRATION_URL")
+
+# YOLO models ("name=path,name=path" for extra named versions)
+YOLO_MODEL_PATH = os.getenv("YOLO_MODEL_PATH", "YOLOv8-str-flower-model.pt")
+YOLO_MODEL_VERSIONS = os.getenv("YOLO_MODEL_VERSIONS", "")
+# /models/{name}/reload only loads model files inside this directory (default: the directory of YOLO_MODEL_PATH)
+YOLO_MODEL_DIR = os.getenv("YOLO_MODEL_DIR", os.path.dirname(os.path.abspath(YOLO_MODEL_PATH)))
+# inference engine: "torch", "onnx" or "openvino", precision: "fp32" or "int8" (see model_export.py)
+YOLO_ENGINE = os.getenv("YOLO_ENGINE", "torch")
+YOLO_PRECISION = os.getenv("YOLO_PRECISION", "fp32")
+YOLO_IMGSZ = int(os.getenv("YOLO_IMGSZ", "640"))
+
+# tiled inference for high-resolution frames (overlap is a fraction of the tile size)
+YOLO_TILED = os.getenv("YOLO_TILED", "false").lower() == "true"
+YOLO_TILE_SIZE = int(os.getenv("YOLO_TILE_SIZE", "640"))
+YOLO_TILE_OVERLAP = float(os.getenv("YOLO_TILE_OVERLAP", "0.2"))
+
+# micro-batching of concurrent /find-flower-yolo requests
+YOLO_MAX_BATCH_SIZE = int(os.getenv("YOLO_MAX_BATCH_SIZE", "8"))
+YOLO_MAX_WAIT_MS = float(os.getenv("YOLO_MAX_WAIT_MS", "10"))
+
+# worker processes for CPU-bound detection (0 runs detection on API process threads)
+DETECTION_WORKERS = int(os.getenv("DETECTION_WORKERS", "2"))
+
+# detections kept for on-demand rendering (/find-flower-yolo/render)
+DETECTION_STORE_MAX_BYTES = int(os.getenv("DETECTION_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+DETECTION_STORE_TTL = float(os.getenv("DETECTION_STORE_TTL", "600"))
+
+# detection result cache (RESULT_CACHE_DIR enables the shared on-disk tier), entries and bytes kept in memory, bytes on disk
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "")
+RESULT_CACHE_DISK_MAX_BYTES = int(os.getenv("RESULT_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# per-rover near-duplicate frame suppression (FRAME_DEDUP_WINDOW=0 disables it)
+FRAME_DEDUP_WINDOW = int(os.getenv("FRAME_DEDUP_WINDOW", "8"))
+FRAME_DEDUP_MAX_DISTANCE = int(os.getenv("FRAME_DEDUP_MAX_DISTANCE", "4"))
+FRAME_DEDUP_MAX_AGE = float(os.getenv("FRAME_DEDUP_MAX_AGE", "30"))
+
+# frames buffered per /ws/find-flower-yolo connection, older ones are dropped
+WS_FRAME_QUEUE_SIZE = int(os.getenv("WS_FRAME_QUEUE_SIZE", "1"))
+
+# per-rover flower tracking across frames (needs rover_id on the request)
+FLOWER_TRACKING = os.getenv("FLOWER_TRACKING", "false").lower() == "true"
+TRACK_IOU_THRESHOLD = float(os.getenv("TRACK_IOU_THRESHOLD", "0.3"))
+TRACK_MAX_MISSED = int(os.getenv("TRACK_MAX_MISSED", "5"))
+TRACK_HIGH_CONFIDENCE = float(os.getenv("TRACK_HIGH_CONFIDENCE", "0.5"))
+
+# OpenCV detector: HSV range of flower-white ("h,s,v"), blob area range in pixels of the 500x500 frame
+# (CV_MAX_AREA=0 for no limit) and opening/closing kernel sizes (0 skips that step)
+CV_HSV_LOWER = tuple(int(v) for v in os.getenv("CV_HSV_LOWER", "0,0,200").split(","))
+CV_HSV_UPPER = tuple(int(v) for v in os.getenv("CV_HSV_UPPER", "180,30,255").split(","))
+CV_MIN_AREA = int(os.getenv("CV_MIN_AREA", "4"))
+CV_MAX_AREA = int(os.getenv("CV_MAX_AREA", "0"))
+CV_OPEN_KERNEL = int(os.getenv("CV_OPEN_KERNEL", "0"))
+CV_CLOSE_KERNEL = int(os.getenv("CV_CLOSE_KERNEL", "0"))
+
+# gating checks in front of YOLO on a downscaled frame (long side FRAME_GATE_SIZE): Laplacian variance below
+# GATE_MIN_SHARPNESS is blurred, more than GATE_MAX_CLIPPED of the pixels at the histogram ends is over/underexposed,
+# a share of flower-white pixels (CV_HSV_LOWER..CV_HSV_UPPER) below GATE_MIN_WHITE_RATIO has nothing to detect
+FRAME_GATE = os.getenv("FRAME_GATE", "false").lower() == "true"
+FRAME_GATE_SIZE = int(os.getenv("FRAME_GATE_SIZE", "256"))
+GATE_MIN_SHARPNESS = float(os.getenv("GATE_MIN_SHARPNESS", "15"))
+GATE_MAX_CLIPPED = float(os.getenv("GATE_MAX_CLIPPED", "0.6"))
+GATE_MIN_WHITE_RATIO = float(os.getenv("GATE_MIN_WHITE_RATIO", "0.0002"))
+
+# admission control of the POST /find-flower-* routes: requests running at once (0 disables it), requests waiting
+# for a slot beyond which new ones get 429, and the longest a request may wait before it gets 503
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_DEADLINE_MS = float(os.getenv("ADMISSION_DEADLINE_MS", "5000"))
+
+# largest image body the binary routes accept (bytes), larger ones get 413
+MAX_BODY_BYTES = int(os.getenv("MAX_BODY_BYTES", str(50 * 1024 * 1024)))
+
+# /rover/trigger Postgres -> MongoDB transfer, operations moved (and committed) per batch
+ETL_BATCH_SIZE = int(os.getenv("ETL_BATCH_SIZE", "100"))
+
+# ingested rover images are re-encoded as TRANSCODE_FORMAT ("webp" or "jpeg") at TRANSCODE_QUALITY (0-100), longer side
+# capped at TRANSCODE_MAX_SIDE (0 keeps the size), plus a thumbnail per THUMBNAIL_SIZES long side, TRANSCODE_WORKERS at a time
+TRANSCODE_FORMAT = os.getenv("TRANSCODE_FORMAT", "webp")
+TRANSCODE_QUALITY = int(os.getenv("TRANSCODE_QUALITY", "80"))
+TRANSCODE_MAX_SIDE = int(os.getenv("TRANSCODE_MAX_SIDE", "2048"))
+THUMBNAIL_SIZES = tuple(int(v) for v in os.getenv("THUMBNAIL_SIZES", "256,1024").split(",") if v)
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", "2"))
+
+# shared Postgres connection pool: connections kept open, prepared statements cached per connection
+# (0 behind pgbouncer in transaction mode), seconds a request waits for a free connection before failing
+# and seconds opening a new connection may take
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "1"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "10"))
+PG_STATEMENT_CACHE_SIZE = int(os.getenv("PG_STATEMENT_CACHE_SIZE", "100"))
+PG_ACQUIRE_TIMEOUT = float(os.getenv("PG_ACQUIRE_TIMEOUT", "5"))
+PG_CONNECT_TIMEOUT = float(os.getenv("PG_CONNECT_TIMEOUT", "5"))
+
+# background ingestion: wakes on NOTIFY operations_inserted (see migrations/operations_notify.sql) or every
+# INGEST_POLL_SECONDS, and drains new operations in batches of INGEST_BATCH_SIZE. Replicas drain one at a time.
+INGEST_WORKER = os.getenv("INGEST_WORKER", "true").lower() == "true"
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "30"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "20"))
+# an operation that fails to migrate is quarantined and retried after INGEST_RETRY_SECONDS, doubling per attempt
+INGEST_RETRY_SECONDS = float(os.getenv("INGEST_RETRY_SECONDS", "60"))
+INGEST_MAX_RETRY_SECONDS = float(os.getenv("INGEST_MAX_RETRY_SECONDS", "3600"))
+
+# async blob uploads: uploads in flight at once, retries with jittered exponential backoff (base delay in ms)
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "16"))
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "4"))
+UPLOAD_BACKOFF_MS = float(os.getenv("UPLOAD_BACKOFF_MS", "200"))
+
+# blob storage backend: "azure", "local" (files under STORAGE_LOCAL_DIR) or "memory" (in-process, with a simulated
+# round trip of STORAGE_MEMORY_LATENCY_MS), local and memory blobs are served at STORAGE_PUBLIC_URL/<name>
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "azure")
+STORAGE_LOCAL_DIR = os.getenv("STORAGE_LOCAL_DIR", "blob-storage")
+STORAGE_PUBLIC_URL = os.getenv("STORAGE_PUBLIC_URL", "/storage")
+STORAGE_MEMORY_LATENCY_MS = float(os.getenv("STORAGE_MEMORY_LATENCY_MS", "0"))
+STORAGE_CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE", str(1024 * 1024)))
+AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+AZURE_STORAGE_CONTAINER_NAME = os.getenv("AZURE_STORAGE_CONTAINER_NAME")
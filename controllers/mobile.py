@@ -258,6 +258,20 @@ async def generate_unique_user_id(db_manager: DatabaseManager):
 
 
 # Parse the JSON string into a Python list and get count
+# points from tracked detections that were already seen in an earlier frame are not counted again
 def count_flower_points_from_jason_string(image_data):
     points = json.loads(image_data)
-    return len(points)
\ No newline at end of file
+
+    # image_data kept as a JSON string in the operation document
+    if isinstance(points, str):
+        try:
+            points = json.loads(points)
+        except ValueError:
+            print(f"Unreadable image data, counted as 0 flowers: {points[:100]}")
+            return 0
+
+    if not isinstance(points, list):
+        print(f"Image data is not a list of points, counted as 0 flowers: {type(points).__name__}")
+        return 0
+
+    return sum(1 for point in points if not (isinstance(point, dict) and point.get("isNew") is False))
\ No newline at end of file
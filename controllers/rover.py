@@ -0,0 +1,312 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import ETL_BATCH_SIZE, INGEST_RETRY_SECONDS, INGEST_MAX_RETRY_SECONDS
+from database import DatabaseManager
+from db_con import pg_pool
+from image_transcode import image_transcoder
+from upload_image import blob_uploader
+
+OPERATION_COLUMNS = ("id", "rover_id", "random_id", "battery_status", "temp", "humidity",
+                     "result_image", "image_data", "created_at")
+
+# one migration at a time across every process and replica sharing the database (session advisory lock)
+MIGRATION_LOCK_KEY = 71_400_001
+TRY_LOCK_QUERY = "SELECT pg_try_advisory_lock($1);"
+UNLOCK_QUERY = "SELECT pg_advisory_unlock($1);"
+
+# keyset pagination on (created_at, id), a range scan with the index of migrations/operations_keyset_index.sql
+# quarantined operations waiting for their retry are left out by ID
+FIRST_BATCH_QUERY = f"""
+SELECT {", ".join(OPERATION_COLUMNS)}
+FROM operations
+WHERE NOT (id = ANY($1))
+ORDER BY created_at, id
+LIMIT $2;
+"""
+
+NEXT_BATCH_QUERY = f"""
+SELECT {", ".join(OPERATION_COLUMNS)}
+FROM operations
+WHERE (created_at, id) > ($1, $2) AND NOT (id = ANY($3))
+ORDER BY created_at, id
+LIMIT $4;
+"""
+
+DELETE_BATCH_QUERY = "DELETE FROM operations WHERE id = ANY($1);"
+
+OPERATIONS_COLLECTION = "operations"
+# progress of the migration, the (created_at, id) of the last batch recorded in MongoDB
+CHECKPOINT_COLLECTION = "migration_checkpoints"
+CHECKPOINT_ID = "operations"
+# operations that failed to migrate, with their error and when to retry them
+QUARANTINE_COLLECTION = "operations_quarantine"
+
+# one transfer at a time in this process (manual trigger or ingestion worker), two would move the same rows
+# twice, the advisory lock does the same across processes
+_trigger_lock = asyncio.Lock()
+# MongoDB indexes are created by the first run of the process (the Postgres index is a migration)
+_indexes_ready = False
+
+
+async def fetch_batch(connection, after: Optional[Tuple], batch_size: int, skipped: List[int] = ()) -> List[dict]:
+    """
+    Reads the next batch of operations after the (created_at, id) key of the previous one.
+    The LIMIT bounds what comes back, both queries are prepared once per pooled connection.
+
+    :param skipped: IDs of operations to leave out.
+    """
+    if after is None:
+        rows = await connection.fetch(FIRST_BATCH_QUERY, list(skipped), batch_size)
+    else:
+        rows = await connection.fetch(NEXT_BATCH_QUERY, *after, list(skipped), batch_size)
+    return [dict(row) for row in rows]
+
+
+async def delete_batch(connection, ids: List[int]):
+    """Deletes the transferred operations, committed on its own so each batch is done independently of the next."""
+    await connection.execute(DELETE_BATCH_QUERY, ids)
+
+
+def to_document(operation: dict, blob_url: str, thumbnails: Dict[str, str]) -> dict:
+    return {
+        "id": operation["id"],
+        "rover_id": operation["rover_id"],
+        "random_id": operation["random_id"],
+        "battery_status": operation["battery_status"],
+        "temp": operation["temp"],
+        "humidity": operation["humidity"],
+        "blob_url": blob_url,
+        # thumbnail URLs by their longer side in pixels, e.g. {"256": ..., "1024": ...}
+        "thumbnails": thumbnails,
+        "image_data": operation["image_data"],
+        "created_at": operation["created_at"],
+    }
+
+
+def operation_key(operation: dict) -> Tuple:
+    return operation["created_at"], operation["id"]
+
+
+async def ensure_mongo_indexes(db_manager: DatabaseManager):
+    """One document per operation, so a replayed batch updates instead of duplicating."""
+    try:
+        await db_manager.mongo_manager.db[OPERATIONS_COLLECTION].create_index("id", unique=True)
+    except Exception as e:
+        # e.g. duplicates left by earlier runs, upserts still keep new batches idempotent
+        print(f"Could not create unique index on {OPERATIONS_COLLECTION}.id: {e}")
+
+
+async def load_watermark(db_manager: DatabaseManager) -> Optional[Tuple]:
+    checkpoint = await db_manager.mongo_manager.db[CHECKPOINT_COLLECTION].find_one({"_id": CHECKPOINT_ID})
+    if checkpoint is None:
+        return None
+    # kept as ISO text, MongoDB would drop the time zone of a timestamptz
+    return datetime.fromisoformat(checkpoint["created_at"]), checkpoint["id"]
+
+
+async def save_watermark(db_manager: DatabaseManager, key: Tuple, rows: int):
+    await db_manager.mongo_manager.db[CHECKPOINT_COLLECTION].update_one(
+        {"_id": CHECKPOINT_ID},
+        {"$set": {"created_at": key[0].isoformat(), "id": key[1], "updated_at": datetime.now(timezone.utc)},
+         "$inc": {"rows": rows}},
+        upsert=True,
+    )
+
+
+async def load_quarantine(db_manager: DatabaseManager) -> Dict[int, dict]:
+    """:return: Attempts and retry time of every quarantined operation, by ID."""
+    cursor = db_manager.mongo_manager.db[QUARANTINE_COLLECTION].find({}, {"attempts": 1, "retry_at": 1})
+    return {
+        document["_id"]: {"attempts": document["attempts"], "retry_at": datetime.fromisoformat(document["retry_at"])}
+        for document in await cursor.to_list(None)
+    }
+
+
+async def quarantine_operations(db_manager: DatabaseManager, operations: List[dict], errors: Dict[int, Exception],
+                                quarantine: Dict[int, dict]):
+    """
+    Records operations that failed to migrate. They stay in Postgres and are retried after an exponential
+    backoff (INGEST_RETRY_SECONDS doubling per attempt, up to INGEST_MAX_RETRY_SECONDS), not on every run.
+    """
+    now = datetime.now(timezone.utc)
+    for operation in operations:
+        operation_id = operation["id"]
+        attempts = quarantine.get(operation_id, {}).get("attempts", 0) + 1
+        retry_at = now + timedelta(seconds=min(INGEST_RETRY_SECONDS * 2 ** min(attempts - 1, 20), INGEST_MAX_RETRY_SECONDS))
+
+        await db_manager.mongo_manager.db[QUARANTINE_COLLECTION].replace_one({"_id": operation_id}, {
+            "_id": operation_id,
+            "rover_id": operation["rover_id"],
+            "created_at": operation["created_at"].isoformat(),
+            "error": str(errors[operation_id]),
+            "attempts": attempts,
+            "failed_at": now,
+            "retry_at": retry_at.isoformat(),
+        }, upsert=True)
+        quarantine[operation_id] = {"attempts": attempts, "retry_at": retry_at}
+        print(f"Operation {operation_id} quarantined (attempt {attempts}): {errors[operation_id]}")
+
+
+async def release_quarantine(db_manager: DatabaseManager, ids: List[int], quarantine: Dict[int, dict]):
+    await db_manager.mongo_manager.db[QUARANTINE_COLLECTION].delete_many({"_id": {"$in": ids}})
+    for operation_id in ids:
+        quarantine.pop(operation_id, None)
+
+
+async def migrate_operation(operation: dict) -> dict:
+    """Transcodes the image of one operation into a master and thumbnails, uploads them and returns its document."""
+    renditions = await image_transcoder.transcode(operation["result_image"] or "")
+
+    # the renditions upload concurrently, as operation-<id>.<ext> and operation-<id>-<size>.<ext>
+    urls = await blob_uploader.upload_many(
+        ((data, extension) for _, extension, data in renditions),
+        names=[f"operation-{operation['id']}" + (f"-{size}" if size else "") for size, _, _ in renditions],
+    )
+    thumbnails = {str(size): url for (size, _, _), url in zip(renditions[1:], urls[1:])}
+    return to_document(operation, urls[0], thumbnails)
+
+
+async def migrate_batch(db_manager: DatabaseManager, operations: List[dict],
+                        watermark: Optional[Tuple]) -> Tuple[int, Dict[int, Exception]]:
+    """
+    Uploads and upserts one batch, idempotently.
+
+    Operations up to the watermark may already be in MongoDB (a run stopped between recording a batch and
+    deleting it from Postgres), those keep their document and blobs and are only deleted. The others are
+    transcoded into a compressed master and thumbnails on the transcoder's worker threads. Blobs are named
+    after the operation ID, so even a repeated upload overwrites rather than adds a blob.
+    An operation that fails (e.g. a corrupt image) fails alone, the rest of the batch is still recorded.
+
+    :return: Number of operations that were uploaded, and the error of every operation that failed, by ID.
+    """
+    done = set()
+    if watermark is not None:
+        maybe_done = [operation["id"] for operation in operations if operation_key(operation) <= watermark]
+        if maybe_done:
+            cursor = db_manager.mongo_manager.db[OPERATIONS_COLLECTION].find({"id": {"$in": maybe_done}}, {"id": 1})
+            done = {document["id"] for document in await cursor.to_list(None)}
+
+    pending = [operation for operation in operations if operation["id"] not in done]
+    results = await asyncio.gather(*(migrate_operation(operation) for operation in pending), return_exceptions=True)
+
+    documents, failed = [], {}
+    for operation, result in zip(pending, results):
+        if isinstance(result, Exception):
+            failed[operation["id"]] = result
+        else:
+            documents.append(result)
+
+    await db_manager.upsert_many_to_mongo(documents, key="id", collection_name=OPERATIONS_COLLECTION)
+    return len(documents), failed
+
+
+async def drain_operations(db_manager: DatabaseManager, batch_size: int = ETL_BATCH_SIZE,
+                           on_batch: Optional[Callable[[List[dict]], None]] = None) -> dict:
+    """
+    Moves all operations from Postgres to MongoDB in batches, resumable after a failure.
+    The caller holds _trigger_lock. Nothing is moved (and "locked" is set in the result) while another
+    process holds the migration advisory lock.
+
+    Each batch is read with keyset pagination, its images uploaded and upserted into MongoDB, the
+    (created_at, id) watermark of the batch recorded in MongoDB, and then deleted from Postgres with
+    one DELETE and committed. A run that stops at any step redoes at most that one batch, without
+    uploading again what was already recorded. The pooled connection holding the advisory lock runs
+    the batch queries too.
+
+    Operations that fail are quarantined and stay in Postgres, the run carries on after them, and later
+    runs leave them out until their retry time.
+
+    :param on_batch: Called with the operations of every batch that were moved, once they are committed.
+    :return: Rows moved, uploads, rows failed and quarantined, batches and seconds of the run, and the
+             watermark it resumed from.
+    """
+    async with pg_pool.acquire() as connection:
+        if not await connection.fetchval(TRY_LOCK_QUERY, MIGRATION_LOCK_KEY):
+            return {"locked": True, "rows": 0, "uploaded": 0, "failed": 0, "quarantined": 0, "batches": 0,
+                    "resumed_from": None, "seconds": 0.0}
+        try:
+            return await _drain_locked(connection, db_manager, batch_size, on_batch)
+        finally:
+            await connection.execute(UNLOCK_QUERY, MIGRATION_LOCK_KEY)
+
+
+async def _drain_locked(connection, db_manager: DatabaseManager, batch_size: int,
+                        on_batch: Optional[Callable[[List[dict]], None]]) -> dict:
+    global _indexes_ready
+
+    if not _indexes_ready:
+        await ensure_mongo_indexes(db_manager)
+        _indexes_ready = True
+    watermark = resumed_from = await load_watermark(db_manager)
+    quarantine = await load_quarantine(db_manager)
+    now = datetime.now(timezone.utc)
+    skipped = [operation_id for operation_id, entry in quarantine.items() if entry["retry_at"] > now]
+
+    rows, uploaded, failed, batches, after = 0, 0, 0, 0, None
+    started = time.perf_counter()
+    while True:
+        operations = await fetch_batch(connection, after, batch_size, skipped)
+        if not operations:
+            break
+
+        batch_uploaded, errors = await migrate_batch(db_manager, operations, watermark)
+        moved = [operation for operation in operations if operation["id"] not in errors]
+        if errors:
+            await quarantine_operations(db_manager, [operation for operation in operations if operation["id"] in errors],
+                                        errors, quarantine)
+        retried = [operation["id"] for operation in moved if operation["id"] in quarantine]
+        if retried:
+            await release_quarantine(db_manager, retried, quarantine)
+
+        # operations up to the watermark are in MongoDB even if the delete below never happens,
+        # failed ones are not, and are looked up again when they are retried
+        last_key = operation_key(operations[-1])
+        if watermark is None or last_key > watermark:
+            watermark = last_key
+            await save_watermark(db_manager, watermark, len(moved))
+        if moved:
+            await delete_batch(connection, [operation["id"] for operation in moved])
+
+        rows += len(moved)
+        uploaded += batch_uploaded
+        failed += len(errors)
+        batches += 1
+        # failed operations are passed over, not fetched again by this run
+        after = last_key
+        if on_batch is not None and moved:
+            on_batch(moved)
+        print(f"Trigger batch {batches}: {len(moved)} operations moved, {len(errors)} failed")
+
+    elapsed = time.perf_counter() - started
+
+    return {"locked": False, "rows": rows, "uploaded": uploaded, "failed": failed, "quarantined": len(quarantine),
+            "batches": batches, "resumed_from": resumed_from, "seconds": elapsed}
+
+
+async def run_trigger_controller(db_manager: DatabaseManager, batch_size: int = ETL_BATCH_SIZE) -> dict:
+    """Drains all pending operations now, the manual kick next to the background ingestion worker."""
+    if _trigger_lock.locked():
+        return {"message": "Trigger already running."}
+
+    async with _trigger_lock:
+        result = await drain_operations(db_manager, batch_size)
+    if result["locked"]:
+        return {"message": "Trigger already running in another process."}
+
+    rows, elapsed, resumed_from = result["rows"], result["seconds"], result["resumed_from"]
+    if not rows and not result["failed"]:
+        return {"message": "No operations found."}
+    return {
+        "message": "Trigger executed and data added to MongoDB successfully.",
+        "rows": rows,
+        "uploaded": result["uploaded"],
+        "failed": result["failed"],
+        "quarantined": result["quarantined"],
+        "batches": result["batches"],
+        "resumed_from": {"created_at": resumed_from[0], "id": resumed_from[1]} if resumed_from else None,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 2) if elapsed else None,
+    }
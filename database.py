@@ -1,6 +1,7 @@
 import logging
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional, Dict
+from pymongo import ReplaceOne
+from typing import Optional, Dict, List
 
 # MongoDB connection manager
 class MongoDBManager:
@@ -72,6 +73,29 @@ class DatabaseManager:
             raise
 
 
+    async def upsert_many_to_mongo(self, documents: List[Dict], key: str = "id", collection_name: str = "operations"):
+        """
+        Inserts or replaces many documents, matched on a key field, in one round trip.
+
+        Args:
+            documents (List[Dict]): The documents to write.
+            key (str): Field identifying a document (default: "id").
+            collection_name (str): The name of the MongoDB collection (default: "operations").
+        """
+        if not documents:
+            return None
+        try:
+            collection = self.mongo_manager.db[collection_name]
+            result = await collection.bulk_write(
+                [ReplaceOne({key: document[key]}, document, upsert=True) for document in documents], ordered=False
+            )
+            logging.info(f"{result.upserted_count} documents added, {result.modified_count} updated in MongoDB")
+            return result
+        except Exception as e:
+            logging.error(f"Failed to upsert data to MongoDB: {e}")
+            raise
+
+
     async def check_health(self):
         """
         Checks the health of all database connections.
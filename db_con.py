@@ -1,8 +1,14 @@
-import psycopg2
-from psycopg2.extensions import connection as _connection
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import asyncpg
 from dotenv import load_dotenv
 import os
 
+from config import PG_POOL_MIN_SIZE, PG_POOL_MAX_SIZE, PG_STATEMENT_CACHE_SIZE, PG_ACQUIRE_TIMEOUT, PG_CONNECT_TIMEOUT
+
 # Load .env file
 load_dotenv()
 
@@ -19,11 +25,97 @@ db_connection_string = os.getenv(
     f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
 )
 
-def get_db_connection() -> _connection:
-    """Establish and return a database connection."""
-    try:
-        connection = psycopg2.connect(db_connection_string)
-        return connection
-    except Exception as e:
-        raise RuntimeError(f"Error connecting to the database: {e}")
+class PostgresPool:
+    """
+    One asyncpg connection pool shared by the API, opened at startup and closed at shutdown.
+
+    Connections are reused across requests (no connect and auth per call) and keep their prepared
+    statements, up to statement_cache_size per connection (0 behind pgbouncer in transaction mode).
+    Waiting for a free connection is bounded by acquire_timeout and opening a connection by connect_timeout,
+    after either asyncio.TimeoutError is raised.
+    """
+
+    def __init__(self, dsn: str, min_size: int, max_size: int, statement_cache_size: int, acquire_timeout: float,
+                 connect_timeout: float):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max(1, max_size)
+        self.statement_cache_size = statement_cache_size
+        self.acquire_timeout = acquire_timeout
+        self.connect_timeout = connect_timeout
+        self._pool: Optional[asyncpg.Pool] = None
+        self._open_lock: Optional[asyncio.Lock] = None
+
+        # stats
+        self.waiting = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def open(self) -> asyncpg.Pool:
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+
+        async with self._open_lock:
+            if self._pool is None:
+                self._pool = await asyncpg.create_pool(
+                    self.dsn,
+                    min_size=min(self.min_size, self.max_size),
+                    max_size=self.max_size,
+                    statement_cache_size=self.statement_cache_size,
+                    timeout=self.connect_timeout,
+                )
+            return self._pool
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        """A pooled connection for the duration of the block (opens the pool if startup could not)."""
+        pool = self._pool or await self.open()
+
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            connection = await pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.waiting -= 1
+            waited = time.perf_counter() - started
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+        self.acquired += 1
+        try:
+            yield connection
+        finally:
+            await pool.release(connection)
+
+    def stats(self) -> dict:
+        size = self._pool.get_size() if self._pool is not None else 0
+        idle = self._pool.get_idle_size() if self._pool is not None else 0
+        return {
+            "open": int(self._pool is not None),
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "size": size,
+            "in_use": size - idle,
+            "idle": idle,
+            "saturation": round((size - idle) / self.max_size, 3),
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "timeouts": self.timeouts,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+        }
+
 
+# Global Postgres pool instance
+pg_pool = PostgresPool(db_connection_string, PG_POOL_MIN_SIZE, PG_POOL_MAX_SIZE, PG_STATEMENT_CACHE_SIZE,
+                       PG_ACQUIRE_TIMEOUT, PG_CONNECT_TIMEOUT)
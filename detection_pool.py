@@ -0,0 +1,225 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy
+
+from config import DETECTION_WORKERS
+from readiness import readiness
+
+# (shared memory block name, shape, dtype) of an image handed to a worker
+ImageSpec = Tuple[str, Tuple[int, ...], str]
+
+
+### worker process side
+
+def _init_worker(versions: Dict[str, str], default_name: Optional[str], threads: int):
+    """Loads every model version once per worker process and warms it up."""
+    import torch
+    from model_registry import registry
+    from yolo_method import warm_up
+
+    torch.set_num_threads(threads)
+
+    if default_name in versions:
+        registry.load(default_name, versions[default_name])
+    for name, path in versions.items():
+        if name != default_name:
+            registry.load(name, path)
+
+    warm_up()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _load(specs: List[ImageSpec]) -> List[numpy.ndarray]:
+    """
+    Copies the images out of their shared memory blocks and closes the blocks.
+    The models never see views of shared memory: an ultralytics predictor keeps references to its last
+    inputs, and a block with a live view cannot be closed.
+    """
+    images = []
+    for name, shape, dtype in specs:
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            view = numpy.ndarray(shape, dtype=dtype, buffer=block.buf)
+            images.append(view.copy())
+            del view
+        finally:
+            block.close()
+    return images
+
+
+def _yolo_batch(model_name: Optional[str], specs: List[ImageSpec]):
+    from yolo_method import detect_flowers
+
+    return detect_flowers(_load(specs), model_name)
+
+
+def _cv_batch(specs: List[ImageSpec], include_image: bool) -> List[dict]:
+    from openCV_method import process_images
+
+    return process_images(_load(specs), include_image)
+
+
+### API process side
+
+def _share(image: numpy.ndarray) -> Tuple[shared_memory.SharedMemory, ImageSpec]:
+    """Copies a decoded image into a new shared memory block."""
+    block = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+    numpy.ndarray(image.shape, dtype=image.dtype, buffer=block.buf)[...] = image
+    return block, (block.name, image.shape, image.dtype.str)
+
+
+def _release(blocks: List[shared_memory.SharedMemory]):
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+class DetectionPool:
+    """
+    Runs CPU-bound detection in worker processes that each keep warm models loaded.
+
+    Decoded images are handed over through multiprocessing.shared_memory, only the small block
+    descriptors are pickled. Calls block the calling thread, so run them from a threadpool.
+    If a worker dies (e.g. killed out of memory) the pool is restarted, and reported not ready until
+    the new workers are warm.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._warming: List[Future] = []
+        self._lock = threading.Lock()
+        self._recover_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def _spawn(self, versions: Dict[str, str], default_name: Optional[str]) -> Tuple[ProcessPoolExecutor, List[Future]]:
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(versions, default_name, threads),
+        )
+
+        # spawn all workers now so models are warm before traffic arrives
+        return executor, [executor.submit(_ping) for _ in range(self.workers)]
+
+    def _swap(self, executor: ProcessPoolExecutor, warming: List[Future]):
+        with self._lock:
+            previous, self._executor = self._executor, executor
+            self._warming = warming
+        if previous is not None:
+            previous.shutdown(wait=False)
+
+    def start(self, versions: Dict[str, str], default_name: Optional[str] = None):
+        """
+        Starts (or restarts with new model versions) the worker processes.
+        Work already submitted to the previous pool still finishes there.
+        """
+        self._swap(*self._spawn(versions, default_name))
+
+    def replace(self, versions: Dict[str, str], default_name: Optional[str] = None, timeout: Optional[float] = None):
+        """
+        Restarts the workers with new model versions once the new workers are warm, the previous pool serves
+        meanwhile. If the new workers fail to load the models they are discarded, the previous pool keeps
+        serving and the error is raised.
+        """
+        executor, warming = self._spawn(versions, default_name)
+        try:
+            for future in warming:
+                future.result(timeout)
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        self._swap(executor, warming)
+
+    def wait_ready(self, timeout: Optional[float] = None):
+        """Blocks until the workers started last have loaded and warmed up their models, raises if they failed."""
+        with self._lock:
+            warming = list(self._warming)
+        for future in warming:
+            future.result(timeout)
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        with self._lock:
+            executor = self._executor
+        if executor is None:
+            raise RuntimeError("Detection pool is not running")
+
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            self._recover(executor)
+            raise RuntimeError("A detection pool worker died, the pool is restarting")
+
+    def _recover(self, broken: ProcessPoolExecutor):
+        # once per broken pool, requests failing on it at the same time wait here and find it replaced
+        with self._recover_lock:
+            with self._lock:
+                if self._executor is not broken:
+                    return
+            print("A detection pool worker died, restarting the pool")
+            readiness.failed("detection_pool", RuntimeError("worker died, restarting"))
+            start_pool()
+        threading.Thread(target=self._wait_recovered, daemon=True).start()
+
+    def _wait_recovered(self):
+        try:
+            self.wait_ready()
+            print("Detection pool workers ready")
+            readiness.ready("detection_pool")
+        except Exception as e:
+            print(f"Failed to restart detection pool: {e}")
+            readiness.failed("detection_pool", e)
+
+    def run_yolo_batch(self, model_name: Optional[str], images: List[numpy.ndarray]):
+        shared = [_share(image) for image in images]
+        try:
+            return self._run(_yolo_batch, model_name, [spec for _, spec in shared])
+        finally:
+            _release([block for block, _ in shared])
+
+    def run_cv_batch(self, images: List[numpy.ndarray], include_image: bool = True) -> List[dict]:
+        shared = [_share(image) for image in images]
+        try:
+            return self._run(_cv_batch, [spec for _, spec in shared], include_image)
+        finally:
+            _release([block for block, _ in shared])
+
+
+# Global detection pool instance
+pool = DetectionPool(DETECTION_WORKERS)
+
+
+def start_pool():
+    """(Re)starts the pool workers with the model versions currently in the registry."""
+    from model_registry import registry
+
+    if pool.enabled:
+        pool.start(registry.paths(), registry.default_name)
+
+
+def replace_pool(timeout: Optional[float] = None):
+    """Restarts the pool workers with the model versions currently in the registry, see DetectionPool.replace."""
+    from model_registry import registry
+
+    if pool.enabled:
+        pool.replace(registry.paths(), registry.default_name, timeout)
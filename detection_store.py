@@ -0,0 +1,64 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy
+
+from config import DETECTION_STORE_MAX_BYTES, DETECTION_STORE_TTL
+
+
+class DetectionStore:
+    """
+    Keeps the encoded original image and raw detections of recent requests so the annotated
+    image can be rendered later, only when a client asks for it.
+
+    Entries are evicted least recently used first once max_bytes is exceeded, and expire after ttl seconds.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(self, data, boxes: numpy.ndarray, confs: numpy.ndarray) -> Optional[str]:
+        """
+        :param data: Encoded original image bytes.
+        :return: Detection ID, or None when the image alone is larger than the store.
+        """
+        size = len(data)
+        if size > self.max_bytes:
+            return None
+
+        detection_id = uuid.uuid4().hex
+        entry = (time.monotonic() + self.ttl, bytes(data), numpy.asarray(boxes), numpy.asarray(confs))
+
+        with self._lock:
+            self._entries[detection_id] = entry
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted, _, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return detection_id
+
+    def get(self, detection_id: str) -> Optional[Tuple[bytes, numpy.ndarray, numpy.ndarray]]:
+        with self._lock:
+            entry = self._entries.get(detection_id)
+            if entry is None:
+                return None
+
+            expires, data, boxes, confs = entry
+            if expires < time.monotonic():
+                del self._entries[detection_id]
+                self._size -= len(data)
+                return None
+
+            self._entries.move_to_end(detection_id)
+            return data, boxes, confs
+
+
+# Global detection store instance
+detection_store = DetectionStore(DETECTION_STORE_MAX_BYTES, DETECTION_STORE_TTL)
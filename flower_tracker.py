@@ -0,0 +1,96 @@
+import itertools
+import threading
+from typing import Dict, Hashable, Tuple
+
+import numpy
+
+from config import TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED, TRACK_HIGH_CONFIDENCE
+
+
+def iou_matrix(a: numpy.ndarray, b: numpy.ndarray) -> numpy.ndarray:
+    """
+    :param a: (M, 4) xyxy boxes.
+    :param b: (N, 4) xyxy boxes.
+    :return: (M, N) intersection over union of every pair.
+    """
+    top_left = numpy.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = numpy.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = numpy.prod(numpy.clip(bottom_right - top_left, 0, None), axis=2)
+
+    area_a = numpy.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = numpy.prod(b[:, 2:] - b[:, :2], axis=1)
+    return intersection / numpy.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def _associate(detections: numpy.ndarray, tracks: numpy.ndarray, threshold: float) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Optimal one-to-one matching on IoU, pairs below the threshold are rejected."""
+    from scipy.optimize import linear_sum_assignment
+
+    if not len(detections) or not len(tracks):
+        return numpy.zeros(0, int), numpy.zeros(0, int)
+
+    iou = iou_matrix(detections, tracks)
+    rows, cols = linear_sum_assignment(-iou)
+    keep = iou[rows, cols] >= threshold
+    return rows[keep], cols[keep]
+
+
+class FlowerTracker:
+    """
+    Per-rover IoU tracker in the style of ByteTrack, over normalized xyxy box arrays.
+
+    High-confidence detections are matched to the rover's tracks first, the remaining tracks then get
+    a chance at the low-confidence ones. Unmatched detections start new tracks, so every flower is
+    reported as new exactly once. Tracks not matched for max_missed frames are dropped.
+    """
+
+    def __init__(self, iou_threshold: float, max_missed: int, high_confidence: float):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.high_confidence = high_confidence
+        self._tracks: Dict[Hashable, Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]] = {}
+        self._next_id = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def update(self, rover_id: Hashable, boxes: numpy.ndarray, confs: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        :param boxes: (N, 4) xyxy boxes of one frame, normalized to the frame size.
+        :param confs: (N,) confidences.
+        :return: (track ID per box, whether the box is a flower seen for the first time).
+        """
+        boxes = numpy.asarray(boxes, numpy.float32).reshape(-1, 4)
+        confs = numpy.asarray(confs, numpy.float32).reshape(-1)
+
+        with self._lock:
+            track_boxes, track_ids, missed = self._tracks.get(
+                rover_id, (numpy.zeros((0, 4), numpy.float32), numpy.zeros(0, numpy.int64), numpy.zeros(0, int))
+            )
+
+            ids = numpy.full(len(boxes), -1, numpy.int64)
+            matched_tracks = numpy.zeros(len(track_ids), bool)
+
+            # high confidence first, then leftover tracks against low confidence detections
+            for selected in (confs >= self.high_confidence, confs < self.high_confidence):
+                det_index = numpy.flatnonzero(selected)
+                free_tracks = numpy.flatnonzero(~matched_tracks)
+                rows, cols = _associate(boxes[det_index], track_boxes[free_tracks], self.iou_threshold)
+                ids[det_index[rows]] = track_ids[free_tracks[cols]]
+                track_boxes[free_tracks[cols]] = boxes[det_index[rows]]
+                matched_tracks[free_tracks[cols]] = True
+
+            is_new = ids < 0
+            ids[is_new] = [next(self._next_id) for _ in range(int(is_new.sum()))]
+
+            missed = numpy.where(matched_tracks, 0, missed + 1)
+            alive = missed <= self.max_missed
+            self._tracks[rover_id] = (
+                numpy.concatenate([track_boxes[alive], boxes[is_new]]),
+                numpy.concatenate([track_ids[alive], ids[is_new]]),
+                numpy.concatenate([missed[alive], numpy.zeros(int(is_new.sum()), int)]),
+            )
+
+        return ids, is_new
+
+
+# Global per-rover flower tracker instance
+flower_tracker = FlowerTracker(TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED, TRACK_HIGH_CONFIDENCE)
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable, Optional, Tuple
+
+import cv2
+import numpy
+
+from config import FRAME_DEDUP_WINDOW, FRAME_DEDUP_MAX_DISTANCE, FRAME_DEDUP_MAX_AGE
+
+
+def frame_hash(data) -> int:
+    """
+    64-bit difference hash (dHash) of an encoded frame.
+
+    The frame is decoded as grayscale at 1/8 scale and shrunk to 9x8, each bit tells whether a pixel
+    is brighter than its right neighbour, so small shifts, noise and compression barely change it.
+    """
+    image = cv2.imdecode(numpy.frombuffer(data, numpy.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        raise ValueError("Failed to decode image from input.")
+
+    small = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(numpy.packbits(bits).tobytes(), "big")
+
+
+class FrameDeduplicator:
+    """
+    Keeps the last few frame hashes of every rover with the response computed for them.
+
+    A new frame within max_distance bits (Hamming distance) of a recent frame from the same rover,
+    processed with the same parameters, reuses that frame's detections instead of running inference.
+    """
+
+    def __init__(self, window: int, max_distance: int, max_age: float):
+        self.window = window
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self._frames: Dict[Hashable, Deque[Tuple[float, int, Hashable, dict]]] = {}
+        self._lock = threading.Lock()
+
+        # stats
+        self.skipped = 0
+        self.processed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def match(self, rover_id: Hashable, hash_value: int, params: Hashable) -> Optional[dict]:
+        """Returns the response of the closest recent matching frame, or None."""
+        oldest = time.monotonic() - self.max_age
+
+        with self._lock:
+            best = None
+            for seen_at, seen_hash, seen_params, response in self._frames.get(rover_id, ()):
+                if seen_at < oldest or seen_params != params:
+                    continue
+                distance = (seen_hash ^ hash_value).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, response)
+
+            if best is None:
+                self.processed += 1
+                return None
+            self.skipped += 1
+            return dict(best[1])
+
+    def remember(self, rover_id: Hashable, hash_value: int, params: Hashable, response: dict):
+        with self._lock:
+            frames = self._frames.get(rover_id)
+            if frames is None:
+                frames = self._frames[rover_id] = deque(maxlen=self.window)
+            frames.append((time.monotonic(), hash_value, params, response))
+
+    def stats(self) -> dict:
+        with self._lock:
+            frames = self.skipped + self.processed
+            return {
+                "window": self.window,
+                "max_distance": self.max_distance,
+                "max_age": self.max_age,
+                "rovers": len(self._frames),
+                "skipped": self.skipped,
+                "processed": self.processed,
+                "skip_ratio": round(self.skipped / frames, 4) if frames else 0,
+            }
+
+
+# Global per-rover frame deduplicator instance
+frame_deduplicator = FrameDeduplicator(FRAME_DEDUP_WINDOW, FRAME_DEDUP_MAX_DISTANCE, FRAME_DEDUP_MAX_AGE)
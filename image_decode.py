@@ -0,0 +1,75 @@
+import struct
+from typing import Optional, Tuple
+
+import cv2
+import numpy
+
+# decode flags that let libjpeg scale down by 2, 4 or 8 while decoding
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# JPEG start-of-frame markers (the ones carrying the image size)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def read_image_size(data) -> Optional[Tuple[int, int]]:
+    """
+    Reads (width, height) from a JPEG or PNG header without decoding the image.
+
+    :return: (width, height), or None for other formats or a malformed header.
+    """
+    data = memoryview(data)
+
+    if bytes(data[:8]) == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+
+    if bytes(data[:2]) != b"\xff\xd8":
+        return None
+
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            # markers without a length field
+            i += 2
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+    return None
+
+
+def decode_reduced(data, min_long_side: int = 0, min_short_side: int = 0) -> Tuple[numpy.ndarray, int]:
+    """
+    Decodes an image at the smallest 1/2, 1/4 or 1/8 scale that still keeps the requested side lengths,
+    so large JPEGs are never fully decoded when the detector only needs a small input.
+
+    :param data: Encoded image bytes (bytes, bytearray or memoryview, read without copying).
+    :return: (decoded image, reduction factor that was applied).
+    """
+    image_array = numpy.frombuffer(data, numpy.uint8)
+
+    size = read_image_size(data)
+    flag, factor = cv2.IMREAD_COLOR, 1
+    if size is not None:
+        long_side, short_side = max(size), min(size)
+        for reduction, reduced_flag in REDUCED_FLAGS:
+            if long_side // reduction >= min_long_side and short_side // reduction >= min_short_side:
+                flag, factor = reduced_flag, reduction
+                break
+
+    image = cv2.imdecode(image_array, flag)
+    if image is None:
+        raise ValueError("Failed to decode image from input.")
+
+    return image, factor
@@ -0,0 +1,146 @@
+import asyncio
+import base64
+import binascii
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy
+
+from config import TRANSCODE_FORMAT, TRANSCODE_QUALITY, TRANSCODE_MAX_SIDE, THUMBNAIL_SIZES, TRANSCODE_WORKERS
+from image_decode import decode_reduced
+
+# encoded image: (long side of a thumbnail, None for the master image), file extension, bytes
+Rendition = Tuple[Optional[int], str, bytes]
+
+ENCODINGS = {
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+}
+
+
+def sniff_extension(data: bytes) -> str:
+    """File extension of PNG or JPEG bytes, by their magic number."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:2] == b"\xff\xd8":
+        return "jpeg"
+    return "bin"
+
+
+def fit(image: numpy.ndarray, long_side: int) -> numpy.ndarray:
+    """Scales the image down so its longer side is at most long_side, never up."""
+    height, width = image.shape[:2]
+    scale = long_side / max(height, width)
+    if scale >= 1:
+        return image
+    return cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def transcode(data: bytes, image_format: str = TRANSCODE_FORMAT, quality: int = TRANSCODE_QUALITY,
+              max_side: int = TRANSCODE_MAX_SIDE, thumbnail_sizes: Tuple[int, ...] = THUMBNAIL_SIZES) -> List[Rendition]:
+    """
+    Re-encodes an image as a compressed master (longer side capped at max_side, 0 keeps the size) and
+    one thumbnail per size in thumbnail_sizes.
+
+    :param data: Encoded image bytes (PNG, JPEG, ...).
+    :return: The master rendition first, then the thumbnails from largest to smallest.
+    """
+    extension, quality_flag = ENCODINGS[image_format]
+
+    if max_side:
+        # JPEGs much larger than the master decode at 1/2, 1/4 or 1/8 scale
+        image, _ = decode_reduced(data, min_long_side=max_side)
+        image = fit(image, max_side)
+    else:
+        image, _ = decode_reduced(data, min_long_side=1 << 30)
+
+    renditions = []
+    for size in (None, *sorted(thumbnail_sizes, reverse=True)):
+        # every thumbnail is scaled from the previous rendition, not again from the master
+        if size is not None:
+            image = fit(image, size)
+        _, buffer = cv2.imencode(extension, image, [quality_flag, quality])
+        renditions.append((size, image_format, buffer.tobytes()))
+    return renditions
+
+
+class ImageTranscoder:
+    """
+    Transcodes ingested images on a pool of `workers` threads.
+
+    OpenCV releases the GIL while decoding, resizing and encoding, so the threads run in parallel
+    without copying the images to other processes. An image that cannot be decoded is kept as it is,
+    under the extension of its actual format. Text that is not base64 raises ValueError, there is
+    nothing to keep.
+    """
+
+    def __init__(self, workers: int, image_format: str = TRANSCODE_FORMAT, quality: int = TRANSCODE_QUALITY):
+        if image_format not in ENCODINGS:
+            raise ValueError(f"Unknown transcode format: {image_format}")
+        self.workers = max(1, workers)
+        self.image_format = image_format
+        self.quality = quality
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="transcode")
+        self._stats_lock = threading.Lock()
+
+        # stats
+        self.images = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def _transcode(self, base64_string: str) -> List[Rendition]:
+        started = time.perf_counter()
+        try:
+            data = base64.b64decode(base64_string.split(",", 1)[1] if base64_string.startswith("data:") else base64_string)
+        except (binascii.Error, ValueError) as e:
+            with self._stats_lock:
+                self.failed += 1
+            raise ValueError(f"Invalid base64 image: {e}")
+
+        try:
+            renditions = transcode(data, self.image_format, self.quality)
+        except Exception as e:
+            print(f"Could not transcode image, keeping the original: {e}")
+            with self._stats_lock:
+                self.failed += 1
+            renditions = [(None, sniff_extension(data), data)]
+
+        with self._stats_lock:
+            self.images += 1
+            self.bytes_in += len(data)
+            self.bytes_out += sum(len(encoded) for _, _, encoded in renditions)
+            self.seconds += time.perf_counter() - started
+        return renditions
+
+    async def transcode(self, base64_string: str) -> List[Rendition]:
+        """
+        Transcodes one base64 image (data URL prefix allowed), the master rendition first.
+        Raises ValueError if the text is not valid base64.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._transcode, base64_string)
+
+    def stop(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "format": self.image_format,
+            "quality": self.quality,
+            "images": self.images,
+            "failed": self.failed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "compression_ratio": round(self.bytes_in / self.bytes_out, 2) if self.bytes_out else 0,
+            "mean_ms": round(self.seconds / self.images * 1000, 3) if self.images else 0,
+        }
+
+
+# Global image transcoder instance
+image_transcoder = ImageTranscoder(TRANSCODE_WORKERS)
@@ -0,0 +1,133 @@
+import asyncio
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class BatchScheduler:
+    """
+    Collects concurrent inference requests into micro-batches.
+
+    A batch is closed when it reaches max_batch_size or when the oldest request in it has waited
+    max_wait_ms, then it runs as one call to run_batch(key, items) on a dedicated thread.
+    Requests are only batched with others sharing the same key (e.g. the model version).
+    Up to max_concurrent_batches batches run at once; while they are all busy new requests keep
+    queueing, so batches grow with load.
+    """
+
+    def __init__(self, run_batch: Callable[[Hashable, List[Any]], List[Any]], max_batch_size: int = 8,
+                 max_wait_ms: float = 10.0, max_concurrent_batches: int = 1):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batches = set()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_batches,
+                                            thread_name_prefix="batch-inference")
+
+        # stats
+        self.batch_sizes = Counter()
+        self.last_batch_size = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        """Queues one item and waits for its own result from the batch it ends up in."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((key, item, future))
+        return await future
+
+    async def run(self, key: Hashable, items: List[Any]) -> List[Any]:
+        """
+        Runs items that already make up a batch (e.g. the tiles of one image) as run_batch(key, items) on the
+        scheduler's threads, queued with the collected batches.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.run_batch, key, items)
+
+    async def _collect(self) -> List[Tuple[Hashable, Any, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            # wait for a free slot first, requests arriving meanwhile join the next batch
+            await self._slots.acquire()
+            batch = await self._collect()
+
+            # one forward pass per key within the collected batch
+            groups: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+            for key, item, future in batch:
+                if not future.cancelled():
+                    groups.setdefault(key, []).append((item, future))
+
+            task = asyncio.create_task(self._dispatch(groups))
+            self._batches.add(task)
+            task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task: asyncio.Task):
+        self._batches.discard(task)
+        self._slots.release()
+
+    async def _dispatch(self, groups: Dict[Hashable, List[Tuple[Any, asyncio.Future]]]):
+        loop = asyncio.get_running_loop()
+
+        for key, entries in groups.items():
+            self.last_batch_size = len(entries)
+            self.batch_sizes[len(entries)] += 1
+
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self.run_batch, key, [item for item, _ in entries]
+                )
+            except Exception as e:
+                for _, future in entries:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(entries, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> dict:
+        batches = sum(self.batch_sizes.values())
+        requests = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_concurrent_batches": self.max_concurrent_batches,
+            "batches": batches,
+            "last_batch_size": self.last_batch_size,
+            "mean_batch_size": round(requests / batches, 2) if batches else 0,
+            "batch_size_counts": dict(sorted(self.batch_sizes.items())),
+        }
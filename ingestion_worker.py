@@ -0,0 +1,178 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import asyncpg
+
+from config import INGEST_POLL_SECONDS, INGEST_BATCH_SIZE, PG_CONNECT_TIMEOUT
+from controllers.rover import _trigger_lock, drain_operations
+from database import DatabaseManager
+from db_con import db_connection_string
+
+# sent by the trigger on operations inserts, see migrations/operations_notify.sql
+NOTIFY_CHANNEL = "operations_inserted"
+
+
+def age_seconds(created_at: datetime) -> float:
+    # naive timestamps are taken as UTC
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - created_at).total_seconds()
+
+
+class IngestionWorker:
+    """
+    Moves new operations from Postgres to MongoDB in the background, as they arrive.
+
+    A dedicated connection LISTENs on the channel a trigger on operations NOTIFYs after every insert,
+    each notification (or, without any, every poll_seconds) wakes the worker to drain the pending
+    operations in batches of batch_size. Notifications arriving during a drain coalesce into one more.
+    If the listening connection is lost the worker keeps polling and reconnects on the next wake up.
+    Workers of several processes or replicas can all run, one drains at a time (the migration advisory
+    lock) and the others skip that wake up.
+    """
+
+    def __init__(self, dsn: str, channel: str, poll_seconds: float, batch_size: int):
+        self.dsn = dsn
+        self.channel = channel
+        self.poll_seconds = poll_seconds
+        self.batch_size = max(1, batch_size)
+        self._db_manager: Optional[DatabaseManager] = None
+        self._connection = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._failures = 0
+
+        # stats
+        self.notifications = 0
+        self.polls = 0
+        self.drains = 0
+        self.skipped_drains = 0
+        self.batches = 0
+        self.rows = 0
+        self.failed_rows = 0
+        self.quarantined = 0
+        self.errors = 0
+        self.last_batch_size = 0
+        self.lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self.rows_per_second = 0.0
+        self.busy_seconds = 0.0
+
+    def start(self, db_manager: DatabaseManager):
+        if self._task is None or self._task.done():
+            self._db_manager = db_manager
+            self._wake = asyncio.Event()
+            # catch up with whatever arrived while the API was down
+            self._wake.set()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._close_connection()
+
+    def kick(self):
+        """Wakes the worker for a drain now."""
+        if self._wake is not None:
+            self._wake.set()
+
+    def _notified(self, connection, pid, channel, payload):
+        self.notifications += 1
+        self._wake.set()
+
+    async def _listen(self):
+        if self._connection is not None and not self._connection.is_closed():
+            return
+        await self._close_connection()
+        try:
+            self._connection = await asyncpg.connect(self.dsn, timeout=PG_CONNECT_TIMEOUT)
+            await self._connection.add_listener(self.channel, self._notified)
+            print(f"Ingestion worker listening on {self.channel}")
+        except Exception as e:
+            print(f"Ingestion worker cannot listen, polling every {self.poll_seconds}s: {e}")
+            await self._close_connection()
+
+    async def _close_connection(self):
+        if self._connection is not None:
+            try:
+                await self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+    async def _run(self):
+        while True:
+            await self._listen()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                self.polls += 1
+            self._wake.clear()
+
+            try:
+                await self.drain()
+                self._failures = 0
+            except Exception as e:
+                self.errors += 1
+                self._failures += 1
+                print(f"Ingestion worker drain failed: {e}")
+                # e.g. MongoDB down, back off instead of failing again on every notification
+                await asyncio.sleep(min(self.poll_seconds, 2 ** min(self._failures, 10)))
+
+    async def drain(self):
+        # waits for a manual trigger run instead of skipping, rows inserted since are drained after it
+        async with _trigger_lock:
+            started = time.perf_counter()
+            result = await drain_operations(self._db_manager, self.batch_size, on_batch=self._record_batch)
+            elapsed = time.perf_counter() - started
+
+        if result["locked"]:
+            self.skipped_drains += 1
+            return
+        self.drains += 1
+        self.failed_rows += result["failed"]
+        self.quarantined = result["quarantined"]
+        if result["rows"]:
+            self.busy_seconds += elapsed
+            self.rows_per_second = result["rows"] / elapsed if elapsed else 0.0
+
+    def _record_batch(self, operations: List[dict]):
+        # lag of the oldest operation of the batch, from its insert into Postgres until it is in MongoDB
+        self.lag_seconds = max(age_seconds(operation["created_at"]) for operation in operations)
+        self.max_lag_seconds = max(self.max_lag_seconds, self.lag_seconds)
+        self.last_batch_size = len(operations)
+        self.batches += 1
+        self.rows += len(operations)
+
+    def stats(self) -> dict:
+        return {
+            "running": int(self._task is not None and not self._task.done()),
+            "listening": int(self._connection is not None and not self._connection.is_closed()),
+            "poll_seconds": self.poll_seconds,
+            "batch_size": self.batch_size,
+            "notifications": self.notifications,
+            "polls": self.polls,
+            "drains": self.drains,
+            "skipped_drains": self.skipped_drains,
+            "batches": self.batches,
+            "rows": self.rows,
+            "failed_rows": self.failed_rows,
+            "quarantined": self.quarantined,
+            "errors": self.errors,
+            "last_batch_size": self.last_batch_size,
+            "lag_seconds": round(self.lag_seconds, 3),
+            "max_lag_seconds": round(self.max_lag_seconds, 3),
+            "rows_per_second": round(self.rows_per_second, 2),
+            "mean_rows_per_second": round(self.rows / self.busy_seconds, 2) if self.busy_seconds else 0,
+        }
+
+
+# Global ingestion worker instance
+ingestion_worker = IngestionWorker(db_connection_string, NOTIFY_CHANNEL, INGEST_POLL_SECONDS, INGEST_BATCH_SIZE)
@@ -1,15 +1,32 @@
+import asyncio
+
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 
-from config import MONGO_URI, MONGO_DB_NAME
+from admission import AdmissionMiddleware, admission_controller
+from config import (MONGO_URI, MONGO_DB_NAME, YOLO_MODEL_PATH, YOLO_MODEL_VERSIONS, YOLO_ENGINE, YOLO_PRECISION,
+                    INGEST_WORKER)
 from database import DatabaseManager
-from db_manager import connect_db
+from db_con import pg_pool
+from db_manager import connect_db, get_db_manager
 from demo_page import demo_page
-from routes import flower, health, rover, mobile, admin
+from detection_pool import pool, start_pool
+from image_transcode import image_transcoder
+from ingestion_worker import ingestion_worker
+from model_registry import load_models
+from readiness import readiness
+from upload_image import blob_uploader
+from yolo_method import yolo_scheduler, warm_up
+from routes import flower, health, rover, mobile, admin, metrics, storage
 
 app = FastAPI()
 
+# bounded concurrency and queue for the detection routes, excess requests are shed before their body is read
+# (added first so it runs inside CORS and rejections still carry the CORS headers)
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -25,6 +42,8 @@ app.include_router(health.router)
 app.include_router(rover.router)
 app.include_router(mobile.router)
 app.include_router(admin.router)
+app.include_router(metrics.router)
+app.include_router(storage.router)
 
 # DB connection
 db_manager = DatabaseManager()
@@ -37,13 +56,85 @@ async def startup_db():
     # else:
     #     print("IN MAIN Connected to MongoDB")
 
-    await connect_db(MONGO_URI, MONGO_DB_NAME)
+    readiness.starting("mongo")
+    try:
+        await connect_db(MONGO_URI, MONGO_DB_NAME)
+    except Exception as e:
+        readiness.failed("mongo", e)
+        raise
+    readiness.ready("mongo")
+
+@app.on_event("startup")
+async def startup_postgres():
+    # rover routes and ingestion share one pool, if Postgres is down the pool opens on first use instead
+    try:
+        await pg_pool.open()
+        print("Postgres pool opened")
+    except Exception as e:
+        print(f"Failed to open Postgres pool: {e}")
+
+@app.on_event("startup")
+async def startup_ingestion():
+    # new operations move to MongoDB as they are inserted, /rover/trigger/ stays as a manual kick
+    if INGEST_WORKER:
+        ingestion_worker.start(get_db_manager())
+
+async def load_and_warm_up_models():
+    # load and fuse every model once and run a dummy inference, requests only run inference
+    # (with the pool the models are built in the workers only, this process just records their paths)
+    try:
+        await run_in_threadpool(load_models, YOLO_MODEL_PATH, YOLO_MODEL_VERSIONS, YOLO_ENGINE, YOLO_PRECISION,
+                                not pool.enabled)
+        if not pool.enabled:
+            # with the pool, inference runs in the workers, which warm up their own copies
+            await run_in_threadpool(warm_up)
+        print(f"YOLO models loaded ({YOLO_ENGINE}, {YOLO_PRECISION})")
+        readiness.ready("models")
+    except Exception as e:
+        print(f"Failed to load YOLO models: {e}")
+        readiness.failed("models", e)
+        return
+
+    if pool.enabled:
+        try:
+            start_pool()
+            await run_in_threadpool(pool.wait_ready)
+            print("Detection pool workers ready")
+            readiness.ready("detection_pool")
+        except Exception as e:
+            print(f"Failed to start detection pool: {e}")
+            readiness.failed("detection_pool", e)
+
+@app.on_event("startup")
+async def startup_models():
+    # models load in the background, the API serves the other routes meanwhile and /ready tells when YOLO can
+    readiness.starting("models")
+    if pool.enabled:
+        readiness.starting("detection_pool")
+    app.state.model_warm_up = asyncio.create_task(load_and_warm_up_models())
+
+    yolo_scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown_ingestion():
+    await ingestion_worker.stop()
+    await pg_pool.close()
+    image_transcoder.stop()
 
 @app.on_event("shutdown")
 async def shutdown_db():
     await db_manager.close_all()
     print("DB connections closed")
 
+@app.on_event("shutdown")
+async def shutdown_uploads():
+    await blob_uploader.close()
+
+@app.on_event("shutdown")
+async def shutdown_models():
+    await yolo_scheduler.stop()
+    pool.stop()
+
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -0,0 +1,92 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from prometheus_client import Counter, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from pipeline_timing import record_stages
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS = Counter(
+    "flower_detection_requests_total", "Detection requests handled.", ["route", "engine"]
+)
+ERRORS = Counter(
+    "flower_detection_errors_total", "Detection requests that failed.", ["route", "engine"]
+)
+REQUEST_SECONDS = Histogram(
+    "flower_detection_request_seconds", "End-to-end detection time.", ["route", "engine"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "flower_detection_stage_seconds", "Time spent per detection pipeline stage.", ["route", "engine", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+IMAGE_BYTES = Histogram(
+    "flower_detection_image_bytes", "Size of the encoded input images.", ["route"],
+    buckets=(16e3, 64e3, 256e3, 1e6, 4e6, 16e6, 64e6),
+)
+DETECTIONS = Histogram(
+    "flower_detection_detections", "Flowers detected per image.", ["route", "engine"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200),
+)
+
+
+@contextmanager
+def track_request(route: str, engine: str, image_bytes: int):
+    """
+    Counts and times one detection request, and records the time of every pipeline stage run inside it.
+    """
+    IMAGE_BYTES.labels(route).observe(image_bytes)
+    start = time.perf_counter()
+
+    with record_stages() as timings:
+        try:
+            yield
+        except Exception:
+            ERRORS.labels(route, engine).inc()
+            raise
+        finally:
+            REQUESTS.labels(route, engine).inc()
+            REQUEST_SECONDS.labels(route, engine).observe(time.perf_counter() - start)
+            for name, seconds in timings.items():
+                STAGE_SECONDS.labels(route, engine, name).observe(seconds)
+
+
+def observe_detections(route: str, engine: str, response: dict):
+    DETECTIONS.labels(route, engine).observe(len(response.get("imageResult", ())))
+
+
+class StatsCollector:
+    """
+    Exports the numeric values of components' stats() dicts (scheduler, caches, ...) at scrape time,
+    so those components don't need to know about Prometheus.
+    """
+
+    def __init__(self):
+        self._sources: List[Tuple[str, Callable[[], Dict], Iterable[str]]] = []
+
+    def register(self, name: str, stats: Callable[[], Dict], counters: Iterable[str] = ()):
+        """
+        :param name: Metric name prefix, e.g. "yolo_scheduler".
+        :param stats: Function returning the component's stats dict.
+        :param counters: Keys that only ever increase, exported as counters instead of gauges.
+        """
+        self._sources.append((name, stats, tuple(counters)))
+
+    def collect(self):
+        for name, stats, counters in self._sources:
+            for key, value in stats().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric_name = f"flower_{name}_{key}"
+                if key in counters:
+                    yield CounterMetricFamily(metric_name, f"{name} {key}", value=value)
+                else:
+                    yield GaugeMetricFamily(metric_name, f"{name} {key}", value=value)
+
+
+# Global collector for component stats
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
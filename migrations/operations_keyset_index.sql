@@ -0,0 +1,6 @@
+-- Index for the keyset pagination of the Postgres -> MongoDB transfer (controllers/rover.py), every batch
+-- of operations is a range scan on (created_at, id) instead of a sort of the whole table.
+-- CONCURRENTLY does not block inserts while the index builds, so it runs outside a transaction:
+--   psql "$DB_CONNECTION" -f migrations/operations_keyset_index.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS operations_created_at_id_idx ON operations (created_at, id);
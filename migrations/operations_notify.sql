@@ -0,0 +1,15 @@
+-- NOTIFY operations_inserted after every INSERT into operations (once per statement, not per row),
+-- which wakes the background ingestion worker (ingestion_worker.py). Without it the worker only polls.
+--   psql "$DB_CONNECTION" -f migrations/operations_notify.sql
+
+CREATE OR REPLACE FUNCTION notify_operations_inserted() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('operations_inserted', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS operations_inserted_notify ON operations;
+CREATE TRIGGER operations_inserted_notify
+AFTER INSERT ON operations
+FOR EACH STATEMENT EXECUTE PROCEDURE notify_operations_inserted();
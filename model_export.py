@@ -0,0 +1,159 @@
+import argparse
+import glob
+import os
+import tempfile
+from typing import Iterator, List
+
+import cv2
+import numpy
+
+ENGINES = ("torch", "onnx", "openvino")
+PRECISIONS = ("fp32", "int8")
+
+
+def artifact_path(model_path: str, engine: str = "torch", precision: str = "fp32") -> str:
+    """
+    Maps a .pt model path to the exported artifact for an inference engine.
+
+    :param model_path: Path to the PyTorch model, e.g. "YOLOv8-str-flower-model.pt".
+    :param engine: "torch", "onnx" or "openvino".
+    :param precision: "fp32" or "int8" (ignored for torch).
+    :return: Path of the .pt file, .onnx file or OpenVINO model directory.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown inference engine: {engine}")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}")
+
+    if engine == "torch" or not model_path.endswith(".pt"):
+        return model_path
+
+    stem = model_path[:-len(".pt")]
+    if precision == "int8":
+        stem = f"{stem}_int8"
+    if engine == "onnx":
+        return f"{stem}.onnx"
+    return f"{stem}_openvino_model"
+
+
+def load_calibration_images(image_dir: str, limit: int = 300) -> List[str]:
+    paths = sorted(
+        path for pattern in ("*.jpg", "*.jpeg", "*.png")
+        for path in glob.glob(os.path.join(image_dir, pattern))
+    )
+    if not paths:
+        raise FileNotFoundError(f"No calibration images found in {image_dir}")
+    return paths[:limit]
+
+
+def letterbox(image: numpy.ndarray, imgsz: int) -> numpy.ndarray:
+    """Resizes keeping aspect ratio and pads to imgsz x imgsz, like the ultralytics preprocessing."""
+    height, width = image.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    new_w, new_h = round(width * scale), round(height * scale)
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    return cv2.copyMakeBorder(resized, top, imgsz - new_h - top, left, imgsz - new_w - left,
+                              cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+
+def _yolo(model_path: str):
+    # the API imports artifact_path only, ultralytics (and torch) is loaded when exporting
+    from ultralytics import YOLO
+    return YOLO(model_path)
+
+
+def export_onnx(model_path: str, imgsz: int) -> str:
+    return _yolo(model_path).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+
+
+def export_onnx_int8(model_path: str, imgsz: int, calibration_dir: str) -> str:
+    """Statically quantizes the FP32 ONNX model, calibrated on sample rover images."""
+    try:
+        import onnx
+        from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    except ImportError:
+        raise RuntimeError("INT8 ONNX export needs 'onnx' and 'onnxruntime' installed")
+
+    fp32_path = artifact_path(model_path, "onnx", "fp32")
+    if not os.path.exists(fp32_path):
+        fp32_path = export_onnx(model_path, imgsz)
+
+    input_name = onnx.load(fp32_path).graph.input[0].name
+    image_paths = load_calibration_images(calibration_dir)
+
+    class RoverImageReader(CalibrationDataReader):
+        def __init__(self):
+            self._batches = self._read()
+
+        def _read(self) -> Iterator[dict]:
+            for path in image_paths:
+                image = cv2.imread(path, cv2.IMREAD_COLOR)
+                if image is None:
+                    continue
+                # BGR HWC uint8 -> RGB NCHW float32, as fed by the ultralytics predictor
+                tensor = letterbox(image, imgsz)[:, :, ::-1].transpose(2, 0, 1)
+                tensor = numpy.ascontiguousarray(tensor, dtype=numpy.float32)[None] / 255.0
+                yield {input_name: tensor}
+
+        def get_next(self):
+            return next(self._batches, None)
+
+    int8_path = artifact_path(model_path, "onnx", "int8")
+    quantize_static(
+        fp32_path, int8_path, RoverImageReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+
+    # keep the ultralytics metadata (class names, stride, imgsz) so the model loads the same way
+    fp32_model, int8_model = onnx.load(fp32_path), onnx.load(int8_path)
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, int8_path)
+    return int8_path
+
+
+def export_openvino(model_path: str, imgsz: int, calibration_dir: str = None) -> str:
+    """Exports the OpenVINO model, INT8-quantized with NNCF when calibration images are given."""
+    if calibration_dir is None:
+        return _yolo(model_path).export(format="openvino", imgsz=imgsz, dynamic=True)
+
+    # ultralytics calibrates from a dataset yaml, point both splits at the image folder
+    image_dir = os.path.abspath(calibration_dir)
+    load_calibration_images(image_dir)
+    with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False) as data:
+        data.write(f"path: {image_dir}\ntrain: .\nval: .\nnames:\n  0: flower\n")
+
+    try:
+        exported = _yolo(model_path).export(format="openvino", imgsz=imgsz, dynamic=True, int8=True, data=data.name)
+    finally:
+        os.remove(data.name)
+
+    int8_path = artifact_path(model_path, "openvino", "int8")
+    if os.path.abspath(exported) != os.path.abspath(int8_path):
+        os.replace(exported, int8_path)
+    return int8_path
+
+
+def export_all(model_path: str, imgsz: int, calibration_dir: str = None) -> List[str]:
+    """Exports FP32 ONNX and OpenVINO artifacts, plus INT8 ones when calibration images are given."""
+    artifacts = [export_onnx(model_path, imgsz), export_openvino(model_path, imgsz)]
+    if calibration_dir:
+        artifacts.append(export_onnx_int8(model_path, imgsz, calibration_dir))
+        artifacts.append(export_openvino(model_path, imgsz, calibration_dir))
+    return artifacts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the flower model for ONNX Runtime and OpenVINO.")
+    parser.add_argument("--model", default="YOLOv8-str-flower-model.pt")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--calibration-dir", help="Folder of sample rover images for INT8 calibration.")
+    args = parser.parse_args()
+
+    for artifact in export_all(args.model, args.imgsz, args.calibration_dir):
+        print(f"Exported {artifact}")
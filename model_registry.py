@@ -0,0 +1,217 @@
+import copy
+import hashlib
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from model_export import artifact_path
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+
+class ModelRegistry:
+    """
+    Keeps named YOLO model versions loaded once and hands out one instance per worker thread.
+
+    Models are built (and fused) once per load. Each thread gets its own copy of the loaded model
+    on first use, because an ultralytics predictor keeps per-call state and is not thread safe.
+    Reloading a name swaps the loaded model under a lock and bumps its generation, so requests
+    already holding the old instance finish on it and the next request picks up the new one.
+    Version tags ("name@digest") come from the model file's content, so they are the same across
+    restarts and replicas for the same file and change whenever the file does.
+
+    With build_models off (the API process when detection runs in pool workers) only the paths and
+    versions are recorded, the workers build their own models and this process never imports torch.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, Optional["YOLO"]] = {}
+        self._paths: Dict[str, str] = {}
+        self._generations: Dict[str, int] = {}
+        self._digests: Dict[str, str] = {}
+        self._local = threading.local()
+        self.default_name: Optional[str] = None
+        self.build_models = True
+
+    @staticmethod
+    def engine_of(path: str) -> str:
+        """Inference engine ultralytics picks for a model file: "torch", "onnx" or "openvino"."""
+        if path.endswith(".onnx"):
+            return "onnx"
+        if path.rstrip("/\\").endswith("_openvino_model"):
+            return "openvino"
+        return "torch"
+
+    @staticmethod
+    def digest_of(path: str) -> str:
+        """Short blake2b digest of a model file, or of every file of a model directory (OpenVINO)."""
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, file) for root, _, names in os.walk(path) for file in names)
+        else:
+            files = [path]
+
+        digest = hashlib.blake2b(digest_size=8)
+        for file in files:
+            digest.update(os.path.relpath(file, path).encode())
+            with open(file, "rb") as model_file:
+                while chunk := model_file.read(1024 * 1024):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _build(path: str) -> "YOLO":
+        # imported on first load, so starting the API does not wait for torch
+        from ultralytics import YOLO
+
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model file not found: {path}")
+
+        model = YOLO(path, task="detect")
+        if path.endswith(".pt"):
+            model.fuse()
+        return model
+
+    def load(self, name: str, path: str) -> str:
+        """
+        Loads (or hot-reloads) a named model version.
+
+        :param name: Model version name, e.g. "default" or "v2".
+        :param path: Path to the model file.
+        :return: Version tag of the loaded model.
+        """
+
+        # build outside the lock, in-flight requests keep using the current model meanwhile
+        if self.build_models:
+            model = self._build(path)
+        elif os.path.exists(path):
+            model = None
+        else:
+            raise FileNotFoundError(f"Model file not found: {path}")
+        digest = self.digest_of(path)
+
+        with self._lock:
+            self._models[name] = model
+            self._paths[name] = path
+            self._generations[name] = self._generations.get(name, 0) + 1
+            self._digests[name] = digest
+            if self.default_name is None:
+                self.default_name = name
+            return f"{name}@{digest}"
+
+    def reload(self, name: str, path: Optional[str] = None) -> str:
+        """
+        Swaps in a new model file for a name (same file again if no path is given).
+        A new name is registered as an extra version when a path is given.
+        """
+        with self._lock:
+            path = path or self._paths.get(name)
+        if path is None:
+            raise KeyError(f"Unknown model version: {name}")
+        return self.load(name, path)
+
+    def entry(self, name: str) -> Optional[Tuple[Optional["YOLO"], str, str]]:
+        """The loaded (model, path, digest) of a name, None if it is not loaded. For restore()."""
+        with self._lock:
+            if name not in self._paths:
+                return None
+            return self._models[name], self._paths[name], self._digests[name]
+
+    def restore(self, name: str, entry: Optional[Tuple[Optional["YOLO"], str, str]]):
+        """Puts back an entry() taken before a reload, or drops the name if it was not loaded then."""
+        with self._lock:
+            if entry is None:
+                for versions in (self._models, self._paths, self._generations, self._digests):
+                    versions.pop(name, None)
+                if self.default_name == name:
+                    self.default_name = next(iter(self._models), None)
+                return
+            self._models[name], self._paths[name], self._digests[name] = entry
+            self._generations[name] = self._generations.get(name, 0) + 1
+
+    def _resolve(self, name: Optional[str]) -> Tuple[str, Optional["YOLO"], int]:
+        with self._lock:
+            name = name or self.default_name
+            if name not in self._models:
+                raise KeyError(f"Model version not loaded: {name}")
+            return name, self._models[name], self._generations[name]
+
+    def get(self, name: Optional[str] = None) -> "YOLO":
+        """Returns this thread's instance of the named (or default) model version."""
+        name, model, generation = self._resolve(name)
+        if model is None:
+            raise RuntimeError(f"Model version {name} is only loaded in the detection pool workers")
+
+        instances = getattr(self._local, "instances", None)
+        if instances is None:
+            instances = self._local.instances = {}
+
+        cached = instances.get(name)
+        if cached is None or cached[0] != generation:
+            cached = (generation, copy.deepcopy(model))
+            instances[name] = cached
+        return cached[1]
+
+    def version(self, name: Optional[str] = None) -> str:
+        """Returns the version tag ("name@digest") of the named (or default) model."""
+        name, _, _ = self._resolve(name)
+        with self._lock:
+            return f"{name}@{self._digests[name]}"
+
+    def engine(self, name: Optional[str] = None) -> str:
+        """Returns the inference engine of the named (or default) model version."""
+        name, _, _ = self._resolve(name)
+        with self._lock:
+            return self.engine_of(self._paths[name])
+
+    def paths(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._paths)
+
+    def describe(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                name: {
+                    "path": self._paths[name],
+                    "engine": self.engine_of(self._paths[name]),
+                    "version": f"{name}@{self._digests[name]}",
+                    "default": name == self.default_name,
+                }
+                for name in self._models
+            }
+
+
+def resolve_model_path(path: str, model_dir: str) -> str:
+    """
+    Resolves a model path given to a reload request against the model directory.
+
+    :param path: Path relative to model_dir (or absolute, if inside it).
+    :return: The real path of the model file.
+    :raises PermissionError: If the path resolves outside model_dir (symlinks included).
+    """
+    model_dir = os.path.realpath(model_dir)
+    resolved = os.path.realpath(os.path.join(model_dir, path))
+    if os.path.commonpath([model_dir, resolved]) != model_dir:
+        raise PermissionError(f"Model path outside the model directory: {path}")
+    return resolved
+
+
+# Global model registry instance
+registry = ModelRegistry()
+
+
+def load_models(default_path: str, versions: str = "", engine: str = "torch", precision: str = "fp32",
+                build: bool = True) -> None:
+    """
+    Loads the default model and any extra named versions given as "name=path,name=path".
+    .pt paths are swapped for their exported artifact when another engine is configured.
+
+    :param build: Build the models in this process, otherwise (and on later reloads) only record them.
+    """
+    registry.build_models = build
+    registry.load("default", artifact_path(default_path, engine, precision))
+
+    for entry in filter(None, (item.strip() for item in versions.split(","))):
+        name, _, path = entry.partition("=")
+        registry.load(name.strip(), artifact_path(path.strip(), engine, precision))
@@ -1,10 +1,21 @@
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
 class ImageRequest(BaseModel):
     image: str
+    model: Optional[str] = None
+    tiled: Optional[bool] = None
+    include_image: bool = True
+    rover_id: Optional[int] = None
+
+class ImageBatchRequest(BaseModel):
+    images: List[str]
+    include_image: bool = True
+
+class ModelReloadRequest(BaseModel):
+    path: Optional[str] = None
 
 class Base64ImageInput(BaseModel):
     base64_string: str
@@ -23,6 +34,7 @@ class ImageData(BaseModel):
     temp: float
     humidity: float
     blob_url: str = ''
+    thumbnails: Dict[str, str] = {}
     image_data: str
     created_at: datetime
 
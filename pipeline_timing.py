@@ -0,0 +1,44 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, FrozenSet, Optional
+
+# stage name -> seconds, for the request (or benchmark call) currently being timed
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+# stages currently open, a stage nested in one of the same name is not counted twice
+_open: ContextVar[FrozenSet[str]] = ContextVar("open_stages", default=frozenset())
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times one pipeline stage, e.g. "imdecode" or "inference".
+    Does nothing unless called inside record_stages(), so it can stay in the hot path.
+    """
+    timings = _timings.get()
+    open_stages = _open.get()
+    if timings is None or name in open_stages:
+        yield
+        return
+
+    token = _open.set(open_stages | {name})
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+        _open.reset(token)
+
+
+@contextmanager
+def record_stages():
+    """
+    Collects the stage timings of everything run inside the block, including code run through
+    run_in_threadpool (which copies the context). Yields the stage name -> seconds dict.
+    """
+    timings: Dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
@@ -0,0 +1,49 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+STARTING = "starting"
+READY = "ready"
+FAILED = "failed"
+
+
+class Readiness:
+    """
+    Startup state of the components the API needs before it can take traffic (databases, warm models, ...).
+
+    Components are marked starting when their startup begins and ready (or failed) when it ends,
+    the readiness probe reports ready once every registered component is.
+    """
+
+    def __init__(self):
+        self._components: Dict[str, Tuple[str, Optional[str], float]] = {}
+        self._started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _set(self, name: str, state: str, detail: Optional[str] = None):
+        with self._lock:
+            self._components[name] = (state, detail, time.monotonic() - self._started_at)
+
+    def starting(self, name: str):
+        self._set(name, STARTING)
+
+    def ready(self, name: str):
+        self._set(name, READY)
+
+    def failed(self, name: str, error: Exception):
+        self._set(name, FAILED, str(error))
+
+    def status(self) -> Tuple[bool, dict]:
+        """
+        :return: (whether every component is ready, state of each component).
+        """
+        with self._lock:
+            components = {
+                name: {"status": state, "seconds": round(seconds, 3), **({"detail": detail} if detail else {})}
+                for name, (state, detail, seconds) in self._components.items()
+            }
+        return all(component["status"] == READY for component in components.values()), components
+
+
+# Global readiness instance
+readiness = Readiness()
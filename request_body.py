@@ -0,0 +1,75 @@
+from fastapi import HTTPException, Request
+from starlette.datastructures import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from config import MAX_BODY_BYTES
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Request body is larger than {max_bytes} bytes.")
+
+
+def _read_upload(upload: UploadFile) -> bytearray:
+    # the spooled upload file is read straight into one buffer
+    upload.file.seek(0)
+    buffer = bytearray(upload.size or 0)
+    filled = upload.file.readinto(buffer) if buffer else 0
+
+    while True:
+        chunk = upload.file.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+        filled += len(chunk)
+    del buffer[filled:]
+    return buffer
+
+
+async def read_image_body(request: Request, field: str = "image", max_bytes: int = MAX_BODY_BYTES) -> bytearray:
+    """
+    Reads an uploaded image from a multipart/form-data field or a raw (application/octet-stream) body.
+
+    The raw body is streamed into a buffer preallocated from Content-Length, which cv2.imdecode then
+    reads through numpy.frombuffer without any further copy. A body declared or found to be larger than
+    max_bytes is refused with 413, before anything is allocated for it or once the stream passes it.
+
+    :return: Encoded image bytes.
+    """
+    content_type = request.headers.get("content-type", "")
+    try:
+        content_length = int(request.headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header.")
+    if content_length > max_bytes:
+        raise _too_large(max_bytes)
+
+    if content_type.startswith("multipart/form-data"):
+        async with request.form() as form:
+            upload = form.get(field)
+            if not isinstance(upload, UploadFile):
+                raise ValueError(f"Multipart body has no '{field}' file field.")
+            if (upload.size or 0) > max_bytes:
+                raise _too_large(max_bytes)
+            buffer = await run_in_threadpool(_read_upload, upload)
+    else:
+        buffer = bytearray(content_length)
+        filled = 0
+        async for chunk in request.stream():
+            end = filled + len(chunk)
+            if end > max_bytes:
+                # Content-Length was missing or wrong, stop reading
+                raise _too_large(max_bytes)
+            if end <= len(buffer):
+                buffer[filled:end] = chunk
+            else:
+                # Content-Length was missing or too small
+                del buffer[filled:]
+                buffer += chunk
+            filled = end
+        del buffer[filled:]
+
+    if not buffer:
+        raise ValueError("Request body is empty.")
+    return buffer
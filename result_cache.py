@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from config import (RESULT_CACHE_SIZE, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL, RESULT_CACHE_DIR,
+                    RESULT_CACHE_DISK_MAX_BYTES)
+
+
+class ResultCache:
+    """
+    Detection results keyed by a hash of the image bytes plus everything that changes the result
+    (engine, model version, request parameters).
+
+    An in-memory LRU bounded by max_entries and max_bytes sits in front of an optional on-disk tier that
+    several workers or instances can share. A result with the annotated image can be tens of MB, entries
+    are sized by their JSON encoding and a single entry larger than max_bytes is kept on disk only.
+    Both tiers expire entries after ttl seconds. The disk tier is swept every sweep_interval seconds, or
+    as soon as disk_max_bytes is exceeded: expired files are removed, then the least recently used ones
+    until it is back under disk_max_bytes.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float, disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 0, sweep_interval: float = 60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = disk_max_bytes
+        self.sweep_interval = sweep_interval
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._disk_size = 0
+        self._next_sweep = 0.0
+
+        # stats
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self.disk_dir is not None
+
+    @staticmethod
+    def make_key(data, *parts) -> str:
+        """
+        :param data: Encoded image bytes.
+        :param parts: Engine, model version and parameters the result depends on.
+        """
+        digest = hashlib.blake2b(data, digest_size=16)
+        digest.update(json.dumps(parts, default=str).encode())
+        return digest.hexdigest()
+
+    def lookup(self, data, *parts) -> Tuple[str, Optional[dict]]:
+        """Hashes the image and looks it up, may read from disk so run it off the event loop."""
+        key = self.make_key(data, *parts)
+        return key, self.get(key)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value, size = entry
+                if expires >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(value)
+                del self._entries[key]
+                self._size -= size
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path) as f:
+                    encoded = f.read()
+                stored = json.loads(encoded)
+                if stored["expires"] >= now:
+                    # the sweep evicts by modification time, a hit counts as a use
+                    os.utime(path)
+                    self._remember(key, stored["value"], stored["expires"], len(encoded))
+                    with self._lock:
+                        self.disk_hits += 1
+                    return dict(stored["value"])
+                os.remove(path)
+            except (OSError, ValueError, KeyError):
+                pass
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _remember(self, key: str, value: dict, expires: float, size: int):
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[2]
+            self._entries[key] = (expires, value, size)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+
+    def put(self, key: str, value: dict):
+        expires = time.time() + self.ttl
+        encoded = json.dumps({"expires": expires, "value": value})
+        self._remember(key, value, expires, len(encoded))
+
+        if self.disk_dir:
+            # write then rename, readers never see a partial file
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+                with os.fdopen(fd, "w") as f:
+                    f.write(encoded)
+                os.replace(tmp_path, self._disk_path(key))
+            except OSError as e:
+                print(f"Failed to write detection cache entry: {e}")
+                return
+
+            with self._lock:
+                self._disk_size += len(encoded)
+                over = self.disk_max_bytes > 0 and self._disk_size > self.disk_max_bytes
+                due = over or time.time() >= self._next_sweep
+            if due:
+                self.sweep_disk()
+
+    def sweep_disk(self):
+        """
+        Removes expired files (and temporary files of writers that died) from the disk tier, then the least
+        recently used ones while it is larger than disk_max_bytes. Other instances may sweep the same directory.
+        """
+        # one sweep at a time, a put arriving during a sweep doesn't wait for it
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.time()
+            files = []
+            with os.scandir(self.disk_dir) as entries:
+                for entry in entries:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    # a file expires at most ttl seconds after it was last written (or read)
+                    if stat.st_mtime + self.ttl < now:
+                        self._remove(entry.path)
+                    elif entry.name.endswith(".json"):
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in files)
+            if self.disk_max_bytes > 0:
+                for _, size, path in sorted(files):
+                    if total <= self.disk_max_bytes:
+                        break
+                    self._remove(path)
+                    total -= size
+
+            with self._lock:
+                self._disk_size = total
+                self._next_sweep = now + self.sweep_interval
+        except OSError as e:
+            print(f"Failed to sweep the detection cache directory: {e}")
+        finally:
+            self._sweep_lock.release()
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self.disk_evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "disk_dir": self.disk_dir,
+                "disk_bytes": self._disk_size,
+                "disk_max_bytes": self.disk_max_bytes,
+                "disk_evictions": self.disk_evictions,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0,
+            }
+
+
+# Global detection result cache instance
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL, RESULT_CACHE_DIR,
+                           RESULT_CACHE_DISK_MAX_BYTES)
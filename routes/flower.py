@@ -1,35 +1,378 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import base64
+from typing import List, Optional
 
-from openCV_method import find_flower_cv
-from yolo_method import find_flower_yolo
-from models.schemas import ImageRequest
+import numpy
+from fastapi import APIRouter, HTTPException, Request, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+
+from admission import admission_controller
+from detection_pool import pool, replace_pool
+from detection_store import detection_store
+from frame_dedup import frame_deduplicator, frame_hash
+from frame_gate import frame_gate
+from model_registry import registry, resolve_model_path
+from openCV_method import decode_image_bytes as decode_cv_image_bytes, process_images, DETECTOR_PARAMS
+from config import (YOLO_TILED, YOLO_IMGSZ, YOLO_TILE_SIZE, YOLO_TILE_OVERLAP, WS_FRAME_QUEUE_SIZE, FLOWER_TRACKING,
+                    YOLO_MODEL_DIR)
+from flower_tracker import flower_tracker
+from metrics import track_request, observe_detections
+from pipeline_timing import stage
+from request_body import read_image_body
+from result_cache import result_cache
+from yolo_method import prepare_image, build_response, detect_flowers_tiled, render_detections, yolo_scheduler
+from models.schemas import ImageRequest, ImageBatchRequest, ModelReloadRequest
 
 router = APIRouter()
 
+
+def strip_data_url(image: str) -> str:
+    if "," in image:
+        return image.split(",")[1]
+    return image
+
+
+async def detect_cv(images: List[numpy.ndarray], include_image: bool) -> List[dict]:
+    # detection runs in a worker process when the pool is enabled
+    if pool.enabled:
+        # the worker process can't report its stages, time the whole call
+        with stage("inference"):
+            return await run_in_threadpool(pool.run_cv_batch, images, include_image)
+    return await run_in_threadpool(process_images, images, include_image)
+
+
+async def run_cv(data, include_image: bool = True) -> dict:
+    cache_key = None
+    if result_cache.enabled:
+        cache_key, cached = await run_in_threadpool(result_cache.lookup, data, "cv", DETECTOR_PARAMS, include_image)
+        if cached is not None:
+            return cached
+
+    image = await run_in_threadpool(decode_cv_image_bytes, data)
+    response, = await detect_cv([image], include_image)
+
+    if cache_key is not None:
+        await run_in_threadpool(result_cache.put, cache_key, response)
+    return response
+
+
+async def run_cv_batch(frames: List[bytes], include_image: bool = True) -> List[dict]:
+    """Detects flowers in many frames with one thresholding and labeling pass."""
+    images = await run_in_threadpool(lambda: [decode_cv_image_bytes(data) for data in frames])
+    return await detect_cv(images, include_image)
+
+
+def yolo_engine(model: Optional[str]) -> str:
+    """Engine label for the metrics, an unknown model version still gets its request counted."""
+    try:
+        return registry.engine(model)
+    except KeyError:
+        return "unknown"
+
+
+def image_size(image) -> int:
+    """Encoded size of an image given as bytes or as base64 text (without decoding it)."""
+    return len(image) * 3 // 4 if isinstance(image, str) else len(image)
+
+
+async def decode_base64_image(image: str) -> bytes:
+    """Decodes a base64 image of a JSON request (data URL prefix allowed)."""
+    with stage("base64_decode"):
+        return await run_in_threadpool(base64.b64decode, strip_data_url(image))
+
+
+async def tracked_cv(route: str, image, include_image: bool = True) -> dict:
+    """:param image: Encoded image bytes, or base64 text, decoded inside the request metrics."""
+    with track_request(route, "opencv", image_size(image)):
+        data = await decode_base64_image(image) if isinstance(image, str) else image
+        response = await run_cv(data, include_image)
+    observe_detections(route, "opencv", response)
+    return response
+
+
+async def tracked_yolo(route: str, image, model: Optional[str], tiled: Optional[bool], include_image: bool,
+                       rover_id: Optional[int] = None) -> dict:
+    """:param image: Encoded image bytes, or base64 text, decoded inside the request metrics."""
+    engine = yolo_engine(model)
+    with track_request(route, engine, image_size(image)):
+        data = await decode_base64_image(image) if isinstance(image, str) else image
+        response = await run_yolo(data, model, tiled, include_image, rover_id)
+    observe_detections(route, engine, response)
+    return response
+
+
+def reused_response(response: dict) -> dict:
+    """Marks a response served without running inference, its flowers were already counted once."""
+    response["inferenceSkipped"] = True
+    if "newImageResult" in response:
+        response["imageResult"] = [{**coord, "isNew": False} for coord in response["imageResult"]]
+        response["newImageResult"] = []
+    return response
+
+
+async def run_yolo(data, model: Optional[str], tiled: Optional[bool], include_image: bool,
+                   rover_id: Optional[int] = None) -> dict:
+    tiled = YOLO_TILED if tiled is None else tiled
+    tracking = FLOWER_TRACKING and rover_id is not None
+
+    # the model version is part of the key, a hot-swapped model never serves stale results
+    cache_key = None
+    if result_cache.enabled:
+        cache_key, cached = await run_in_threadpool(
+            result_cache.lookup, data, "yolo", registry.engine(model), registry.version(model), YOLO_IMGSZ,
+            include_image, (YOLO_TILE_SIZE, YOLO_TILE_OVERLAP) if tiled else None, rover_id if tracking else None,
+            frame_gate.enabled
+        )
+        if cached is not None:
+            return reused_response(cached)
+
+    # a rover resending (almost) the same scene reuses the detections of that recent frame
+    dedup_hash = None
+    dedup_params = (registry.version(model), tiled, include_image)
+    if rover_id is not None and frame_deduplicator.enabled:
+        dedup_hash = await run_in_threadpool(frame_hash, data)
+        duplicate = frame_deduplicator.match(rover_id, dedup_hash, dedup_params)
+        if duplicate is not None:
+            return reused_response(duplicate)
+
+    # tiles and the annotated image need the full resolution frame, plain detection only the model input size
+    target_size = None if tiled or include_image else YOLO_IMGSZ
+    image, scale = await run_in_threadpool(prepare_image, data, target_size)
+
+    # blurred, badly exposed or flowerless frames skip inference with an empty result
+    skip_reason = None
+    if frame_gate.enabled:
+        with stage("gate"):
+            skip_reason = await run_in_threadpool(frame_gate.check, image)
+
+    if skip_reason is not None:
+        boxes, confs = numpy.zeros((0, 4), numpy.float32), numpy.zeros(0, numpy.float32)
+    elif tiled:
+        # the tiles of this frame already make up a batch of their own
+        with stage("inference"):
+            boxes, confs = await detect_flowers_tiled(image, model)
+    else:
+        # inference runs batched together with concurrent requests, includes the time waiting for the batch
+        with stage("inference"):
+            boxes, confs = await yolo_scheduler.submit(model, image)
+
+    # stable track IDs across this rover's frames, so each flower is reported as new only once
+    tracks = None
+    if tracking and skip_reason is not None:
+        # a skipped frame says nothing about the tracked flowers, don't age their tracks
+        tracks = numpy.zeros(0, numpy.int64), numpy.zeros(0, bool)
+    elif tracking:
+        height, width = image.shape[:2]
+        tracks = flower_tracker.update(rover_id, boxes / numpy.array([width, height, width, height]), confs)
+
+    response = await run_in_threadpool(build_response, image, boxes, confs, include_image, tracks)
+    response["inferenceSkipped"] = skip_reason is not None
+    if skip_reason is not None:
+        response["skipReason"] = skip_reason
+    else:
+        # keep the detections so the annotated image can be rendered later on demand
+        detection_id = detection_store.put(data, boxes * scale, confs)
+        if detection_id is not None:
+            response["detectionId"] = detection_id
+
+    if cache_key is not None:
+        await run_in_threadpool(result_cache.put, cache_key, response)
+    if dedup_hash is not None:
+        frame_deduplicator.remember(rover_id, dedup_hash, dedup_params, response)
+    return response
+
+
 @router.post("/find-flower-cv")
 async def find_flower_with_cv(request: ImageRequest):
     try:
-        if "," in request.image:
-            b64img = request.image.split(",")[1]
-        else:
-            b64img = request.image
+        return await tracked_cv("/find-flower-cv", request.image, request.include_image)
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing image with cv: {str(e)}")
 
-        result_base64 = find_flower_cv(b64img)
-        return {"image": f"data:image/png;base64,{result_base64}"}
+@router.post("/find-flower-cv/binary")
+async def find_flower_with_cv_binary(request: Request, include_image: bool = True):
+    """Same as /find-flower-cv, image sent as multipart/form-data field 'image' or as the raw body."""
+    try:
+        data = await read_image_body(request)
+        return await tracked_cv("/find-flower-cv/binary", data, include_image)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing image with cv: {str(e)}")
 
+@router.post("/find-flower-cv/batch")
+async def find_flower_with_cv_batch(request: ImageBatchRequest):
+    """/find-flower-cv for many frames in one request, results in the same order as the images."""
+    route = "/find-flower-cv/batch"
+    try:
+        with track_request(route, "opencv", sum(map(image_size, request.images))):
+            frames = [await decode_base64_image(image) for image in request.images]
+            responses = await run_cv_batch(frames, request.include_image)
+        for response in responses:
+            observe_detections(route, "opencv", response)
+        return {"status": 200, "results": responses}
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing images with cv: {str(e)}")
+
 @router.post("/find-flower-yolo")
 async def find_flower_with_yolo(request: ImageRequest):
     try:
-        if "," in request.image:
-            b64img = request.image.split(",")[1]
-        else:
-            b64img = request.image
+        return await tracked_yolo("/find-flower-yolo", request.image, request.model, request.tiled,
+                                  request.include_image, request.rover_id)
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing image with YOLO: {str(e)}")
+
+@router.post("/find-flower-yolo/binary")
+async def find_flower_with_yolo_binary(request: Request, model: Optional[str] = None, tiled: Optional[bool] = None,
+                                       include_image: bool = True, rover_id: Optional[int] = None):
+    """Same as /find-flower-yolo, image sent as multipart/form-data field 'image' or as the raw body."""
+    try:
+        data = await read_image_body(request)
+        return await tracked_yolo("/find-flower-yolo/binary", data, model, tiled, include_image, rover_id)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing image with YOLO: {str(e)}")
+
+@router.websocket("/ws/find-flower-yolo")
+async def find_flower_with_yolo_stream(websocket: WebSocket, model: Optional[str] = None, tiled: Optional[bool] = None,
+                                       include_image: bool = False, rover_id: Optional[int] = None):
+    """
+    Streaming /find-flower-yolo: send frames as binary messages (or base64 text), get one JSON result
+    per processed frame. Frames arriving faster than inference are dropped oldest first, so each
+    result is for the latest frame and latency stays bounded.
+    """
+    await websocket.accept()
+
+    frames: asyncio.Queue = asyncio.Queue(maxsize=WS_FRAME_QUEUE_SIZE)
+    counters = {"received": 0, "dropped": 0}
+
+    async def receive_frames():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+            data, error = message.get("bytes"), None
+            if data is None:
+                # a bad frame gets its 400 result from the processing loop, the connection stays open
+                try:
+                    data = base64.b64decode(strip_data_url(message.get("text") or ""))
+                except ValueError as e:
+                    error = f"Invalid base64 image: {str(e)}"
+            counters["received"] += 1
+
+            # keep only the newest frames
+            if frames.full():
+                frames.get_nowait()
+                counters["dropped"] += 1
+            frames.put_nowait((counters["received"], data, error))
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            next_frame = asyncio.create_task(frames.get())
+            await asyncio.wait({next_frame, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_frame.done():
+                # client went away, stop processing
+                next_frame.cancel()
+                break
+
+            frame, data, error = next_frame.result()
+            if error is not None:
+                response = {"status": 400, "detail": error}
+            else:
+                try:
+                    response = await tracked_yolo("/ws/find-flower-yolo", data, model, tiled, include_image, rover_id)
+                except Exception as e:
+                    response = {"status": 400, "detail": f"Error processing image with YOLO: {str(e)}"}
+
+            # the response may be shared with the result cache, don't modify it
+            await websocket.send_json({**response, "frame": frame, "droppedFrames": counters["dropped"]})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+
 
-        response = find_flower_yolo(b64img)
-        return response
+@router.get("/find-flower-yolo/render/{detection_id}")
+async def render_yolo_detections(
+        detection_id: str,
+        image_format: str = Query("jpeg", alias="format", pattern="^(jpeg|webp|png)$"),
+        quality: int = Query(85, ge=1, le=100),
+        max_dim: Optional[int] = Query(None, gt=0),
+):
+    stored = detection_store.get(detection_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Detection not found or expired")
+
+    data, boxes, confs = stored
+    try:
+        content, media_type = await run_in_threadpool(
+            render_detections, data, boxes, confs, image_format, quality, max_dim
+        )
+        return Response(content=content, media_type=media_type)
 
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error processing image with YOLO: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=f"Error rendering detections: {str(e)}")
+
+@router.get("/find-flower-yolo/stats")
+async def yolo_scheduler_stats():
+    return yolo_scheduler.stats()
+
+@router.get("/detection-cache/stats")
+async def detection_cache_stats():
+    return result_cache.stats()
+
+@router.get("/frame-dedup/stats")
+async def frame_dedup_stats():
+    return frame_deduplicator.stats()
+
+@router.get("/admission/stats")
+async def admission_stats():
+    return admission_controller.stats()
+
+@router.get("/frame-gate/stats")
+async def frame_gate_stats():
+    return frame_gate.stats()
+
+@router.get("/models")
+async def list_models():
+    return registry.describe()
+
+# one reload at a time, the registry is not swapped again before the workers of the last reload are up
+_reload_lock = asyncio.Lock()
+
+@router.post("/models/{name}/reload")
+async def reload_model(name: str, request: ModelReloadRequest):
+    async with _reload_lock:
+        try:
+            # models are unpickled on load, only files of the model directory are accepted
+            path = resolve_model_path(request.path, YOLO_MODEL_DIR) if request.path else None
+            previous = registry.entry(name)
+            version = await run_in_threadpool(registry.reload, name, path)
+
+        except PermissionError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=e.args[0])
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Failed to reload model: {str(e)}")
+
+        try:
+            # the current workers serve until the new ones have loaded every version and warmed up
+            await run_in_threadpool(replace_pool)
+        except Exception as e:
+            # the new workers could not load the file, keep the previous one (the current workers still run it)
+            registry.restore(name, previous)
+            raise HTTPException(status_code=400,
+                                detail=f"Failed to reload model, the detection workers could not load it: {str(e)}")
+
+        return {"message": f"Model {name} reloaded.", "version": version}
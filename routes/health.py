@@ -3,6 +3,7 @@ from fastapi.responses import JSONResponse
 
 from database import DatabaseManager
 from db_manager import get_db_manager
+from readiness import readiness
 
 router = APIRouter()
 
@@ -15,3 +16,17 @@ async def health_check(db_manager: DatabaseManager = Depends(get_db_manager)):
         "status": overall_status,
         "details": health_status
     })
+
+@router.get("/live")
+async def liveness_check():
+    """Liveness, the process is up and serving requests (models may still be loading)."""
+    return {"status": "alive"}
+
+@router.get("/ready")
+async def readiness_check():
+    """Readiness, 503 until every component (database, warm models, pool workers) has started."""
+    ready, components = readiness.status()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not ready", "components": components},
+    )
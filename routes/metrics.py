@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+
+from admission import admission_controller
+from db_con import pg_pool
+from frame_dedup import frame_deduplicator
+from frame_gate import frame_gate
+from image_transcode import image_transcoder
+from ingestion_worker import ingestion_worker
+from metrics import stats_collector
+from result_cache import result_cache
+from upload_image import blob_uploader
+from yolo_method import yolo_scheduler
+
+router = APIRouter()
+
+# component stats are read at scrape time only
+stats_collector.register("admission", admission_controller.stats, counters=(
+    "admitted", "rejected_queue_full", "rejected_deadline", "timed_out"
+))
+stats_collector.register("blob_uploads", blob_uploader.stats, counters=("uploaded", "retried", "failed"))
+stats_collector.register("yolo_scheduler", yolo_scheduler.stats, counters=("batches",))
+stats_collector.register("result_cache", result_cache.stats, counters=("hits", "disk_hits", "misses", "disk_evictions"))
+stats_collector.register("frame_dedup", frame_deduplicator.stats, counters=("skipped", "processed"))
+stats_collector.register("ingestion", ingestion_worker.stats, counters=(
+    "notifications", "polls", "drains", "skipped_drains", "batches", "rows", "failed_rows", "errors"
+))
+stats_collector.register("transcoding", image_transcoder.stats, counters=("images", "failed", "bytes_in", "bytes_out"))
+stats_collector.register("postgres_pool", pg_pool.stats, counters=("acquired", "timeouts"))
+stats_collector.register("frame_gate", frame_gate.stats, counters=(
+    "passed", "skipped", "skipped_overexposed", "skipped_underexposed", "skipped_no_flower_pixels", "skipped_blurred"
+))
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus metrics of the detection pipeline."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,36 +1,35 @@
+import asyncio
 from typing import List
 
 from fastapi import APIRouter, HTTPException, status, Depends
 
 from db_manager import get_db_manager
-from upload_image import upload_base64_image
+from controllers.rover import run_trigger_controller
+from image_transcode import image_transcoder
+from ingestion_worker import ingestion_worker
 from models.schemas import RoverData, ImageData
 from database import DatabaseManager
-from db_con import get_db_connection
+from db_con import pg_pool
 
 router = APIRouter()
 
 
-@router.post("/rovers/")
-def add_rover(data: RoverData):
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        insert_query = """
-        INSERT INTO rovers (initial_id, rover_status, user_id)
-        VALUES (%s, %s, %s)
-        RETURNING rover_id, created_at;
-        """
+INSERT_ROVER_QUERY = """
+INSERT INTO rovers (initial_id, rover_status, user_id)
+VALUES ($1, $2, $3)
+RETURNING rover_id, created_at;
+"""
 
-        cursor.execute(insert_query, (data.initial_id, data.rover_status, data.user_id))
-        result = cursor.fetchone()
 
-        connection.commit()
-        cursor.close()
-        connection.close()
+@router.post("/rovers/")
+async def add_rover(data: RoverData):
+    try:
+        async with pg_pool.acquire() as connection:
+            result = await connection.fetchrow(INSERT_ROVER_QUERY, data.initial_id, data.rover_status, data.user_id)
 
-        return {"rover_id": result[0], "created_at": result[1]}
+        return {"rover_id": result["rover_id"], "created_at": result["created_at"]}
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Postgres unavailable or no connection free, try again later")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to add rover: {str(e)}")
 
@@ -38,81 +37,32 @@ def add_rover(data: RoverData):
 @router.post("/rover/trigger/")
 async def run_trigger(db_manager: DatabaseManager = Depends(get_db_manager)):
     try:
-        # Get database connection
-        connection = get_db_connection()  # Ensure this supports async if necessary
-        cursor = connection.cursor()
-
-        # SQL query to get the count of operations
-        get_count_query = "SELECT COUNT(*) FROM operations;"
-        cursor.execute(get_count_query)
-        result1 = cursor.fetchone()
-
-        if result1 is None or result1[0] <= 0:
-            return {"message": "No operations found."}
-
-        count = result1[0]
-        for _ in range(count):
-            # SQL query to fetch the oldest operation
-            get_data_query = """
-            SELECT id, rover_id, random_id, battery_status, temp, humidity, 
-                   result_image, image_data, created_at
-            FROM operations
-            ORDER BY created_at ASC
-            LIMIT 1;
-            """
-            cursor.execute(get_data_query)
-            result2 = cursor.fetchone()
-
-            if result2 is None:
-                break
-
-            # Map query result to ImageData model
-            data = ImageData(
-                id=result2[0],
-                rover_id=result2[1],
-                random_id=result2[2],
-                battery_status=result2[3],
-                temp=result2[4],
-                humidity=result2[5],
-                result_image=result2[6],
-                image_data=result2[7],
-                created_at=result2[8],
-            )
-
-            # Remove "data:image/png;base64," from result_image string
-            updated_result_image = data.result_image.replace("data:image/png;base64,", "")
-            blob_url = upload_base64_image(updated_result_image, "jpeg")
-
-            # Add data to MongoDB using db_manager
-            mongo_data = {
-                "id": data.id,
-                "rover_id": data.rover_id,
-                "random_id": data.random_id,
-                "battery_status": data.battery_status,
-                "temp": data.temp,
-                "humidity": data.humidity,
-                "blob_url": blob_url,
-                "image_data": data.image_data,
-                "created_at": data.created_at,
-            }
-
-            await db_manager.add_to_mongo(mongo_data)
-
-            # Delete the record from Postgres
-            delete_data_query = "DELETE FROM operations WHERE id = %s;"
-            cursor.execute(delete_data_query, (data.id,))
-
-        # Commit the transaction and close the SQL connection
-        connection.commit()
-        cursor.close()
-        connection.close()
-
-        return {"message": "Trigger executed and data added to MongoDB successfully."}
+        return await run_trigger_controller(db_manager)
 
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Postgres unavailable or no connection free, try again later")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to run trigger: {str(e)}")
 
 
+@router.get("/rover/ingestion/stats")
+async def ingestion_stats():
+    """Background ingestion worker: wake ups, batches, lag of the last batch and throughput."""
+    return ingestion_worker.stats()
+
+
+@router.get("/rover/transcoding/stats")
+async def transcoding_stats():
+    """Transcoding of ingested images: images, bytes before and after, compression ratio and time per image."""
+    return image_transcoder.stats()
+
+
+@router.get("/postgres/pool/stats")
+async def postgres_pool_stats():
+    """Postgres pool saturation: connections in use and idle, acquires waiting and timed out."""
+    return pg_pool.stats()
+
+
 
 # get recoded image ddata from mongo
 @router.get("/rovers/flower-images/{rover_id}", response_model=List[ImageData])
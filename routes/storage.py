@@ -0,0 +1,19 @@
+import mimetypes
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from blob_storage import storage
+
+router = APIRouter()
+
+@router.get("/storage/{name}")
+async def get_blob(name: str):
+    """Streams a stored image, for the local and in-memory backends whose URLs point here."""
+    try:
+        chunks = await storage.read(name)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+    media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    return StreamingResponse(chunks, media_type=media_type)
@@ -1,37 +1,88 @@
-import base64
-from azure.storage.blob import BlobServiceClient
-from dotenv import load_dotenv
-import os
+import asyncio
+import random
 import uuid
+from typing import Iterable, List, Optional, Tuple, Union
 
-# Load environment variables
-load_dotenv()
+from blob_storage import BlobStorage, storage
+from config import UPLOAD_CONCURRENCY, UPLOAD_RETRIES, UPLOAD_BACKOFF_MS
 
-# Azure Blob Storage Configuration
-CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-CONTAINER_NAME = os.getenv("AZURE_STORAGE_CONTAINER_NAME")
+# image bytes
+Upload = Union[bytes, bytearray, memoryview]
 
-# Initialize Blob Service Client
-blob_service_client = BlobServiceClient.from_connection_string(CONNECTION_STRING)
-container_client = blob_service_client.get_container_client(CONTAINER_NAME)
 
-def upload_base64_image(base64_string: str, file_extension: str = "png") -> str:
-    """Decodes a base64 string, uploads it as an image to Azure Blob Storage, and returns the blob URL."""
-    try:
-        # Decode base64 string to binary data
-        image_data = base64.b64decode(base64_string)
+class AsyncBlobUploader:
+    """
+    Uploads images to the configured blob storage, at most `concurrency` at a time.
 
-        # Generate a unique file name
-        file_name = f"{uuid.uuid4()}.{file_extension}"
+    Failed uploads the backend considers transient are retried with full-jitter exponential backoff
+    (a random delay up to backoff * 2^attempt).
+    """
 
-        # Get blob client
-        blob_client = container_client.get_blob_client(file_name)
+    def __init__(self, blob_storage: BlobStorage, concurrency: int, retries: int, backoff_ms: float):
+        self.storage = blob_storage
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.backoff = backoff_ms / 1000
+        self._slots = None
 
-        # Upload the image data to Azure Blob Storage
-        blob_client.upload_blob(image_data, overwrite=True)
+        # stats
+        self.in_flight = 0
+        self.uploaded = 0
+        self.retried = 0
+        self.failed = 0
 
-        # Generate and return the blob URL
-        blob_url = blob_client.url
-        return blob_url
-    except Exception as e:
-        raise RuntimeError(f"Failed to upload image: {e}")
+    async def upload(self, data: Upload, file_extension: str = "png", name: Optional[str] = None) -> str:
+        """
+        Uploads one image and returns its blob URL.
+
+        :param name: Blob name without extension, a new unique name if not given. A fixed name makes a
+                     repeated upload overwrite the same blob.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        name = f"{name or uuid.uuid4()}.{file_extension}"
+
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                for attempt in range(self.retries + 1):
+                    try:
+                        url = await self.storage.write(name, data)
+                        self.uploaded += 1
+                        return url
+                    except Exception as e:
+                        if attempt == self.retries or not self.storage.is_retryable(e):
+                            self.failed += 1
+                            raise RuntimeError(f"Failed to upload image: {e}")
+                        self.retried += 1
+                        await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            finally:
+                self.in_flight -= 1
+
+    async def upload_many(self, images: Iterable[Tuple[Upload, str]], names: Optional[List[str]] = None) -> List[str]:
+        """
+        :param images: (image, file extension) pairs.
+        :param names: Blob names without extension, one per image, new unique names if not given.
+        :return: Blob URLs in the same order, raises if any upload failed for good.
+        """
+        images = list(images)
+        names = names or [None] * len(images)
+        return list(await asyncio.gather(*(
+            self.upload(data, extension, name) for (data, extension), name in zip(images, names)
+        )))
+
+    async def close(self):
+        await self.storage.close()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "uploaded": self.uploaded,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+# Global async uploader instance
+blob_uploader = AsyncBlobUploader(storage, UPLOAD_CONCURRENCY, UPLOAD_RETRIES, UPLOAD_BACKOFF_MS)
@@ -1,55 +1,213 @@
-from ultralytics import YOLO
 import cv2
 import numpy
 import base64
-import os
+from typing import List, Optional, Tuple
 
-def find_flower_yolo(b64img: str) -> dict:
+from config import YOLO_MAX_BATCH_SIZE, YOLO_MAX_WAIT_MS, YOLO_IMGSZ, YOLO_TILE_SIZE, YOLO_TILE_OVERLAP
+from detection_pool import pool
+from image_decode import decode_reduced
+from inference_scheduler import BatchScheduler
+from model_registry import registry
+from pipeline_timing import stage
+
+# sorting key
+SORT_KEY = "y"
+# note to Rusira: use "x" or "y" to coordinates sort by x-axis or y-axis
+
+CONFIDENCE = 0.3
+TILE_NMS_IOU = 0.5
+
+
+def decode_image_bytes(data) -> numpy.ndarray:
     """
-    :param b64img: Base64 encoded image string (image string part only).
-    :return: A response JSON with processed image and coordinates.
+    :param data: Encoded image bytes (bytes, bytearray or memoryview, read without copying).
+    :return: Decoded image, rotated to the orientation the model expects.
     """
 
-    # sorting key
-    sort_key = "y"
-    # note to Rusira: use "x" or "y" to coordinates sort by x-axis or y-axis
-
-    # decode the Base64 image
-    image_array = numpy.frombuffer(base64.b64decode(b64img), numpy.uint8)
-    image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+    # decode the image
+    with stage("imdecode"):
+        image_array = numpy.frombuffer(data, numpy.uint8)
+        image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
 
     if image is None:
-        raise ValueError("Failed to decode image from Base64 input. Check input, don't send this part 'data:image/png;base64,'.")
+        raise ValueError("Failed to decode image from input.")
 
     # Rotate the image 90 degrees clockwise
-    image = cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+    with stage("rotate"):
+        return cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+
+
+def prepare_image(data, target_size: Optional[int] = YOLO_IMGSZ) -> Tuple[numpy.ndarray, float]:
+    """
+    Decodes straight to (about) the model input size and rotates only the small image.
+
+    The JPEG is decoded at a reduced 1/2, 1/4 or 1/8 scale that still covers target_size, scaled down
+    the rest of the way so the model's own letterbox only pads, and rotated last. The full resolution
+    frame is never decoded or rotated.
 
-    if not os.path.exists("YOLOv8-str-flower-model.pt"):
-        raise FileNotFoundError("Model file not found")
+    :param data: Encoded image bytes.
+    :param target_size: Model input size, None decodes the full resolution frame (e.g. for tiling).
+    :return: (rotated image, factor mapping its pixel coordinates back to the full resolution frame).
+    """
+    if target_size is None:
+        return decode_image_bytes(data), 1.0
+
+    with stage("imdecode"):
+        image, factor = decode_reduced(data, min_long_side=target_size)
+    frame_long_side = max(image.shape[:2]) * factor
+
+    with stage("rotate"):
+        if max(image.shape[:2]) > target_size:
+            ratio = target_size / max(image.shape[:2])
+            image = cv2.resize(image, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA)
+
+        # Rotate the image 90 degrees clockwise
+        image = cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+    return image, frame_long_side / max(image.shape[:2])
+
+
+def detect_flowers(images: List[numpy.ndarray], model_name: Optional[str] = None) -> List[Tuple[numpy.ndarray, numpy.ndarray]]:
+    """
+    Runs one forward pass over a batch of decoded images.
+
+    :return: (boxes, confidences) per image, boxes as xyxy pixel coordinates.
+    """
 
-    # load the YOLO model
-    model = YOLO("YOLOv8-str-flower-model.pt")
+    # get this thread's instance of the already loaded model
+    model = registry.get(model_name)
 
     # run inference and find flowers
-    results = model(image, conf=0.3)
+    with stage("inference"):
+        results = model(images, conf=CONFIDENCE, imgsz=YOLO_IMGSZ, verbose=False)
+
+    return [(result.boxes.xyxy.cpu().numpy(), result.boxes.conf.cpu().numpy()) for result in results]
+
+
+def warm_up():
+    """Dummy inference with every loaded model version, so the first real request does not pay for lazy setup."""
+    dummy = numpy.zeros((YOLO_IMGSZ, YOLO_IMGSZ, 3), numpy.uint8)
+    for name in registry.paths():
+        detect_flowers([dummy], name)
+
+
+def _run_batch(model_name: Optional[str], images: List[numpy.ndarray]) -> List[Tuple[numpy.ndarray, numpy.ndarray]]:
+    # worker processes when the pool is enabled, otherwise this thread's model instance
+    if pool.enabled:
+        return pool.run_yolo_batch(model_name, images)
+    return detect_flowers(images, model_name)
+
+
+def tile_image(image: numpy.ndarray, tile_size: int = YOLO_TILE_SIZE,
+               overlap: float = YOLO_TILE_OVERLAP) -> Tuple[List[numpy.ndarray], numpy.ndarray]:
+    """
+    Cuts an image into overlapping square tiles, the last row/column is aligned to the image edge.
+
+    :param overlap: Overlap between neighbouring tiles as a fraction of the tile size.
+    :return: (tile views, (x, y) offset of each tile).
+    """
+    height, width = image.shape[:2]
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        return positions + [length - tile_size]
+
+    offsets = numpy.array([(x, y) for y in starts(height) for x in starts(width)], dtype=numpy.float32)
+    tiles = [image[int(y):int(y) + tile_size, int(x):int(x) + tile_size] for x, y in offsets]
+    return tiles, offsets
+
+
+def merge_tile_detections(detections: List[Tuple[numpy.ndarray, numpy.ndarray]],
+                          offsets: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Shifts per-tile boxes back to image coordinates and removes duplicates across tile borders with NMS.
+    """
+    counts = [len(boxes) for boxes, _ in detections]
+    if not sum(counts):
+        return numpy.zeros((0, 4), numpy.float32), numpy.zeros(0, numpy.float32)
+
+    boxes = numpy.concatenate([boxes for boxes, _ in detections]).astype(numpy.float32)
+    confs = numpy.concatenate([confs for _, confs in detections]).astype(numpy.float32)
+    boxes += numpy.repeat(offsets, counts, axis=0)[:, [0, 1, 0, 1]]
 
-    # extract bounding boxes and normalize coordinates
-    height, width, _ = image.shape
+    xywh = numpy.column_stack((boxes[:, :2], boxes[:, 2:] - boxes[:, :2]))
+    keep = numpy.asarray(cv2.dnn.NMSBoxes(xywh.tolist(), confs.tolist(), CONFIDENCE, TILE_NMS_IOU), dtype=int).reshape(-1)
+    return boxes[keep], confs[keep]
+
+
+async def detect_flowers_tiled(image: numpy.ndarray, model_name: Optional[str] = None) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Runs the tiles of a high-resolution image in batches of at most YOLO_MAX_BATCH_SIZE and merges the detections.
+    A large frame makes over a hundred tiles, one forward pass over all of them would not fit in memory.
+    The batches run on the scheduler's threads, so without the pool only those threads hold a model copy,
+    and requests batched by the scheduler take turns with them.
+
+    :return: (boxes, confidences) in full image pixel coordinates.
+    """
+    tiles, offsets = tile_image(image)
+    chunk = max(1, YOLO_MAX_BATCH_SIZE)
+
+    detections = []
+    for start in range(0, len(tiles), chunk):
+        detections.extend(await yolo_scheduler.run(model_name, tiles[start:start + chunk]))
+    return merge_tile_detections(detections, offsets)
+
+
+# Global scheduler, batches concurrent requests for the same model version into one forward pass
+yolo_scheduler = BatchScheduler(
+    _run_batch,
+    max_batch_size=YOLO_MAX_BATCH_SIZE,
+    max_wait_ms=YOLO_MAX_WAIT_MS,
+    max_concurrent_batches=max(1, pool.workers),
+)
+
+
+# cv2.imencode extension and quality flag per output format
+RENDER_FORMATS = {
+    "png": (".png", None, "image/png"),
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY, "image/jpeg"),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY, "image/webp"),
+}
+
+
+def normalize_detections(shape: Tuple[int, ...], boxes: numpy.ndarray, confs: numpy.ndarray,
+                         tracks: Optional[Tuple[numpy.ndarray, numpy.ndarray]] = None) -> List[dict]:
+    """
+    :param tracks: Optional (track IDs, first-seen flags) per box from the flower tracker.
+    :return: Box centres normalized to the image size, with confidence, sorted by SORT_KEY.
+    """
+    height, width = shape[:2]
     normalized_coords = []
 
-    for box, conf in zip(results[0].boxes.xyxy.cpu().numpy(), results[0].boxes.conf.cpu().numpy()):
+    for i, (box, conf) in enumerate(zip(boxes, confs)):
         x_min, y_min, x_max, y_max = map(float, box)
-        normalized_coords.append({
+        coord = {
             "x": round((x_min + x_max) / 2 / width, 4),
             "y": round((y_min + y_max) / 2 / height, 4),
             "confidence": round(float(conf), 2),
-        })
+        }
+        if tracks is not None:
+            coord["trackId"] = int(tracks[0][i])
+            coord["isNew"] = bool(tracks[1][i])
+        normalized_coords.append(coord)
+
+    # sorting
+    normalized_coords.sort(key=lambda coord: coord[SORT_KEY])
+    return normalized_coords
+
+
+def draw_detections(image: numpy.ndarray, boxes: numpy.ndarray, confs: numpy.ndarray) -> numpy.ndarray:
+    """Draws bounding boxes and confidence scores on the image (in place)."""
+    for box, conf in zip(boxes, confs):
+        x_min, y_min, x_max, y_max = map(int, box)
 
         # draw bounding boxes on the image
         cv2.rectangle(
             image,
-            (int(x_min), int(y_min)),
-            (int(x_max), int(y_max)),
+            (x_min, y_min),
+            (x_max, y_max),
             (0, 255, 0),
             2
         )
@@ -58,22 +216,71 @@ def find_flower_yolo(b64img: str) -> dict:
         text = f"{conf:.2f}"
         cv2.putText(
             image, text,
-            (int(x_min), int(y_min) - 10),
+            (x_min, y_min - 10),
             cv2.FONT_HERSHEY_SIMPLEX, 0.5,
             (0, 255, 0),
             1, cv2.LINE_AA
         )
+    return image
 
-    # sorting
-    normalized_coords.sort(key=lambda coord: coord[sort_key])
 
-    # convert processed image to Base64
-    _, buffer = cv2.imencode(".png", image)
-    result_base64 = base64.b64encode(buffer).decode("utf-8")
+def build_response(image: numpy.ndarray, boxes: numpy.ndarray, confs: numpy.ndarray, include_image: bool = True,
+                   tracks: Optional[Tuple[numpy.ndarray, numpy.ndarray]] = None) -> dict:
+    """
+    Normalizes the detections and, if asked for, draws them on the image.
+
+    :param tracks: Optional (track IDs, first-seen flags) per box, adds "newImageResult" with first-seen flowers only.
+    :return: A response JSON with coordinates and processed image.
+    """
+
+    normalized_coords = normalize_detections(image.shape, boxes, confs, tracks)
+    response = {"status": 200}
+
+    if include_image:
+        with stage("draw"):
+            draw_detections(image, boxes, confs)
+
+        # convert processed image to Base64
+        with stage("png_encode"):
+            _, buffer = cv2.imencode(".png", image)
+        with stage("base64_encode"):
+            result_base64 = base64.b64encode(buffer).decode("utf-8")
+        response["image"] = f"data:image/png;base64,{result_base64}"
 
     # return JSON
-    return {
-        "status": 200,
-        "image": f"data:image/png;base64,{result_base64}",
-        "imageResult": normalized_coords
-    }
+    response["imageResult"] = normalized_coords
+    if tracks is not None:
+        response["newImageResult"] = [coord for coord in normalized_coords if coord["isNew"]]
+    return response
+
+
+def render_detections(data, boxes: numpy.ndarray, confs: numpy.ndarray, image_format: str = "jpeg",
+                      quality: int = 85, max_dim: Optional[int] = None) -> Tuple[bytes, str]:
+    """
+    Draws stored detections on the original image on demand.
+
+    :param data: Encoded original image bytes.
+    :param image_format: "jpeg", "webp" or "png".
+    :param quality: 1-100, ignored for png.
+    :param max_dim: Longest side of the rendered image, the image is only ever scaled down.
+    :return: (encoded image bytes, media type).
+    """
+    if image_format not in RENDER_FORMATS:
+        raise ValueError(f"Unsupported format: {image_format}")
+    extension, quality_flag, media_type = RENDER_FORMATS[image_format]
+
+    image = decode_image_bytes(data)
+
+    # scale down before drawing so boxes and labels stay readable
+    scale = 1.0
+    if max_dim and max(image.shape[:2]) > max_dim:
+        scale = max_dim / max(image.shape[:2])
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    draw_detections(image, numpy.asarray(boxes, numpy.float32) * scale, confs)
+
+    params = [quality_flag, int(quality)] if quality_flag is not None else []
+    ok, buffer = cv2.imencode(extension, image, params)
+    if not ok:
+        raise ValueError(f"Failed to encode image as {image_format}")
+    return buffer.tobytes(), media_type